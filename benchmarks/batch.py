@@ -0,0 +1,69 @@
+"""
+Benchmark the NumPy batch simulator against the scalar board, placing random pieces with hard drops.
+
+usage: python -m benchmarks.batch [boards] [pieces]
+"""
+import random
+import sys
+import time
+
+import numpy as np
+
+from pytris.batch import BatchBoards
+from pytris.board import Board
+from pytris.engine import GameState
+from pytris.pieces import PIECES_ROT
+from pytris.piecetables import fits, piece_cells
+
+
+def _random_moves(rng: random.Random, boards: int, pieces: int):
+    moves = []
+    for _ in range(pieces):
+        moves.append((
+            np.array([rng.randrange(len(PIECES_ROT)) for _ in range(boards)]),
+            np.array([rng.randrange(4) for _ in range(boards)]),
+            np.array([rng.randrange(-2, Board.WIDTH) for _ in range(boards)])
+        ))
+    return moves
+
+
+def run_scalar(moves, boards: int) -> float:
+    start = time.perf_counter()
+    states = [Board() for _ in range(boards)]
+    for pieces, rotations, cols in moves:
+        for i, board in enumerate(states):
+            piece = int(pieces[i])
+            rotation = int(rotations[i]) % len(PIECES_ROT[piece])
+            line = GameState.SPAWN_POS[piece][0]
+            col = int(cols[i])
+            if not fits(board, piece, rotation, line, col):
+                continue
+            cells = piece_cells(piece, rotation, line, col)
+            distance = board.drop_distance(cells)
+            board.set_cells([(cell[0] + distance, cell[1]) for cell in cells], GameState.CELL[piece])
+            board.clear_lines()
+            board.is_empty()
+    return time.perf_counter() - start
+
+
+def run_batch(moves, boards: int) -> float:
+    start = time.perf_counter()
+    batch = BatchBoards(boards)
+    for pieces, rotations, cols in moves:
+        batch.spawn_pieces(pieces, rotations, cols)
+        batch.hard_drop()
+    return time.perf_counter() - start
+
+
+def main():
+    boards = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    pieces = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    moves = _random_moves(random.Random(0), boards, pieces)
+    placements = boards * pieces
+    for name, runner in (("scalar", run_scalar), ("batch", run_batch)):
+        elapsed = runner(moves, boards)
+        print(f"{name:>8}: {elapsed:.3f}s, {placements / elapsed:,.0f} board steps/s")
+
+
+if __name__ == "__main__":
+    main()
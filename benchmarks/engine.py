@@ -0,0 +1,216 @@
+"""
+Microbenchmarks of the engine hot paths (grid moves, hard drop position, line clears, rotations, T-spin detection).
+Runs without a display. Results are saved as JSON, named after the current commit, and two result files can be
+compared to catch regressions.
+
+usage: python -m benchmarks.engine [output file]
+       python -m benchmarks.engine compare <old results> <new results> [tolerance]
+"""
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from typing import Callable, Dict, List, Tuple
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+from pytris.board import Board
+from pytris.engine import GameState, MOVE_ROT, is_tspin
+from pytris.grid import Grid
+from pytris.pieces import *
+from pytris.piecetables import piece_cells, try_rotate
+from pytris.session import GameSession
+from pytris.sessionstate import SessionState
+
+RESULTS_DIR = os.path.join("benchmarks", "results")
+# best of REPEAT runs of NUMBER operations
+REPEAT = 5
+NUMBER = 5000
+# relative slowdown reported as a regression by compare
+TOLERANCE = 0.10
+
+GARBAGE = 8
+
+
+def make_grid(lines: List[str]) -> List[List[int]]:
+    """
+    :return: grid with the given bottom lines ("X" for used cells)
+    """
+    grid = [[0] * Board.WIDTH for _ in range(Board.HEIGHT - len(lines))]
+    grid += [[GARBAGE if cell == "X" else 0 for cell in line] for line in lines]
+    return grid
+
+
+def _timed(operation: Callable[[], None], number: int) -> float:
+    start = time.perf_counter()
+    for _ in range(number):
+        operation()
+    return time.perf_counter() - start
+
+
+def _new_grid(lines: List[str]) -> Grid:
+    session = GameSession()
+    session.board = Board(make_grid(lines))
+    return Grid(0, 0, session)
+
+
+def bench_move_single(number: int) -> float:
+    grid = _new_grid([])
+    cells = piece_cells(T_PIECE, 0, *GameState.SPAWN_POS[T_PIECE])
+    return _timed(lambda: grid.move(1, 0, cells), number)
+
+
+def bench_move_das(number: int) -> float:
+    # ARR = 0: the whole DAS move is done at once
+    grid = _new_grid([])
+    cells = piece_cells(I_PIECE, 0, 1, 6)
+    return _timed(lambda: grid.move(-10, 0, cells), number)
+
+
+def bench_move_sdf(number: int) -> float:
+    # SDF = 0: the piece goes down as much as possible at once
+    grid = _new_grid(["XXXX..XXXX", "XXXXX.XXXX"])
+    cells = piece_cells(T_PIECE, 0, *GameState.SPAWN_POS[T_PIECE])
+    return _timed(lambda: grid.move(0, 30, cells), number)
+
+
+def bench_get_hd_pos(number: int) -> float:
+    grid = _new_grid(["..XXX.....", "X.XXXX.XXX", "XXXXXX.XXX", "XXXX.XXXXX"])
+    cells = piece_cells(L_PIECE, 2, *GameState.SPAWN_POS[L_PIECE])
+    return _timed(lambda: grid.get_hd_pos(cells), number)
+
+
+def _bench_clear_lines(full_lines: int) -> Callable[[int], float]:
+    lines = ["XXXXXXXXX.", "X.XXXXXXXX", ".XXXXXXXXX", "XXXX.XXXXX"] + ["XXXXXXXXXX"] * full_lines
+    grid = make_grid(lines)
+
+    def bench(number: int) -> float:
+        boards = [Board(grid) for _ in range(number)]
+        start = time.perf_counter()
+        for board in boards:
+            board.clear_lines()
+        return time.perf_counter() - start
+
+    return bench
+
+
+def _kick_position(board: Board, piece: int, rotation: int) -> Tuple[int, int, int, int]:
+    """
+    :return: (line, col, new rotation, kick test) of the first position of the piece needing the latest kick test
+    """
+    best = None
+    for line in range(-2, Board.HEIGHT):
+        for col in range(-2, Board.WIDTH):
+            if not board.fits(piece_cells(piece, rotation, line, col)):
+                continue
+            for new_rotation in ((rotation + 1) % 4, (rotation - 1) % 4):
+                kick = try_rotate(board, piece, rotation, new_rotation, line, col)
+                if kick is not None and (best is None or kick[0] > best[3]):
+                    best = (line, col, new_rotation, kick[0])
+    return best
+
+
+def bench_rotate_kicks(number: int) -> float:
+    session = SessionState()
+    session.init_state("benchmark")
+    session.board = Board(make_grid(["XX........", "X.........", "X.XXXXXXXX", "X..XXXXXXX", "X.XXXXXXXX"]))
+    state = GameState(session, 0, 0, 0, 0)
+    state.reset()
+    session.current_piece = T_PIECE
+    state.spawn_piece()
+    line, col, new_rotation, _ = _kick_position(session.board, T_PIECE, 0)
+    delta = 1 if new_rotation == 1 else -1
+    cells = piece_cells(T_PIECE, 0, line, col)
+
+    def rotate():
+        state._line, state._col, state._rotation, state._cells = line, col, 0, cells
+        state._rotate(delta)
+
+    elapsed = _timed(rotate, number)
+    state.pop_events()
+    return elapsed
+
+
+def bench_is_tspin(number: int) -> float:
+    # T-spin double slot
+    board = Board(make_grid(["XXX.......", "XX...XXXXX", "XXX.XXXXXX"]))
+    target = {(19, 2), (19, 3), (19, 4), (20, 3)}
+    cells = next(piece_cells(T_PIECE, 2, line, col) for line in range(Board.HEIGHT) for col in range(Board.WIDTH)
+                 if set(piece_cells(T_PIECE, 2, line, col)) == target)
+    return _timed(lambda: is_tspin(board, T_PIECE, 2, cells, MOVE_ROT), number)
+
+
+BENCHMARKS: Dict[str, Callable[[int], float]] = {
+    "grid_move_single": bench_move_single,
+    "grid_move_das_10": bench_move_das,
+    "grid_move_sdf_30": bench_move_sdf,
+    "grid_get_hd_pos": bench_get_hd_pos,
+    **{f"clear_lines_{lines}": _bench_clear_lines(lines) for lines in range(5)},
+    "rotate_kicks": bench_rotate_kicks,
+    "is_tspin": bench_is_tspin,
+}
+
+
+def current_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def run(output: str = None):
+    commit = current_commit()
+    results = {}
+    for name, bench in BENCHMARKS.items():
+        # nanoseconds per operation, best run
+        results[name] = min(bench(NUMBER) for _ in range(REPEAT)) / NUMBER * 1e9
+        print(f"{name:>18}: {results[name]:10.1f} ns")
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, f"{commit}.json")
+    with open(output, "w") as f:
+        json.dump({
+            "commit": commit,
+            "date": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "results": results
+        }, f, indent=2)
+    print(f"results saved to {output}")
+
+
+def compare(old_path: str, new_path: str, tolerance: float = TOLERANCE) -> bool:
+    """
+    Print the relative change of each benchmark
+    :return: True if no benchmark is slower by more than the tolerance
+    """
+    with open(old_path) as f:
+        old = json.load(f)
+    with open(new_path) as f:
+        new = json.load(f)
+    print(f"{old['commit']} -> {new['commit']}")
+    ok = True
+    for name, new_time in new["results"].items():
+        old_time = old["results"].get(name)
+        if old_time is None:
+            print(f"{name:>18}: {new_time:10.1f} ns (new)")
+            continue
+        change = new_time / old_time - 1
+        regression = change > tolerance
+        ok = ok and not regression
+        print(f"{name:>18}: {old_time:10.1f} -> {new_time:10.1f} ns {change:+7.1%}{' REGRESSION' if regression else ''}")
+    return ok
+
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] == "compare":
+        tolerance = float(sys.argv[4]) if len(sys.argv) > 4 else TOLERANCE
+        sys.exit(0 if compare(sys.argv[2], sys.argv[3], tolerance) else 1)
+    run(sys.argv[1] if len(sys.argv) > 1 else None)
+
+
+if __name__ == "__main__":
+    main()
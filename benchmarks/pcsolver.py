@@ -0,0 +1,63 @@
+"""
+Benchmark the perfect clear solver over a fixed set of opener positions.
+
+usage: python -m benchmarks.pcsolver [time budget] [workers]
+"""
+import sys
+import time
+
+from pytris.board import Board
+from pytris.pcsolver import solve
+from pytris.pieces import *
+
+PIECE_LETTERS = {
+    "I": I_PIECE,
+    "J": J_PIECE,
+    "L": L_PIECE,
+    "S": S_PIECE,
+    "Z": Z_PIECE,
+    "T": T_PIECE,
+    "O": O_PIECE
+}
+
+# (name, bottom lines of the board ("X" for used cells), queue, hold piece)
+OPENERS = [
+    ("2 lines, empty", [], "ILOIL", None),
+    ("2 lines, open middle", ["X....XXXXX", "X....XXXXX"], "IOI", None),
+    ("2 lines, held I", [], "LJOJLT", "I"),
+    ("3 lines, left well", ["XX........", "XX........", "XX........"], "ISOJZLT", None),
+    ("4 lines, first bag", [], "TIOLJSZIOTJ", None),
+    ("4 lines, second bag", [], "ZSOTLIJJLOT", None),
+    ("4 lines, left column", ["X.........", "X.........", "X.........", "X........."], "OJTZSILLJT", None),
+    ("4 lines, right O", ["........XX", "........XX", "........XX", "........XX"], "TLOZJSIJT", None),
+    ("4 lines, held T", [], "IOJLSZOIJL", "T"),
+]
+
+
+def make_board(lines) -> Board:
+    board = Board()
+    top = Board.HEIGHT - len(lines)
+    for line, cells in enumerate(lines):
+        board.set_cells([(top + line, col) for col, cell in enumerate(cells) if cell == "X"], 8)
+    return board
+
+
+def main():
+    time_budget = float(sys.argv[1]) if len(sys.argv) > 1 else 10.0
+    workers = int(sys.argv[2]) if len(sys.argv) > 2 else 1
+    total = 0.0
+    for name, lines, queue, hold in OPENERS:
+        board = make_board(lines)
+        pieces = [PIECE_LETTERS[letter] for letter in queue]
+        start = time.perf_counter()
+        solution = solve(board, pieces, None if hold is None else PIECE_LETTERS[hold],
+                         time_budget=time_budget, workers=workers)
+        elapsed = time.perf_counter() - start
+        total += elapsed
+        result = "no solution" if solution is None else f"{len(solution)} pieces"
+        print(f"{name:>24}: {elapsed:7.3f}s, {result}")
+    print(f"{'total':>24}: {total:7.3f}s")
+
+
+if __name__ == "__main__":
+    main()
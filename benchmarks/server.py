@@ -0,0 +1,147 @@
+"""
+Benchmark the server loop: CPU used while idle, and response latency of session updates sent one at a time.
+The polling loop (Pump then sleep) the server used before the event loop is kept here for comparison.
+The server runs in its own process, with a memory store.
+
+usage: python -m benchmarks.server [requests]
+"""
+import multiprocessing
+import os
+import socket
+import sys
+import time
+from typing import List
+
+from PodSixNet.rencode import dumps, loads
+
+from pytrisserver.eventloop import new_server_loop
+from pytrisserver.server import MyServer
+from pytrisserver.sessionmanager import SessionManager
+from pytrisserver.store import MemoryStore
+
+ADDRESS = ("127.0.0.1", 4243)
+TERMINATOR = b"\0---\0"
+# time the idle server is measured for, in seconds
+IDLE_TIME = 5.0
+# latency samples
+REQUESTS = 5000
+
+
+def poll_loop(server: MyServer, manager: SessionManager, duration: float):
+    end = time.monotonic() + duration
+    while time.monotonic() < end:
+        server.Pump()
+        manager.poll_verifications()
+        manager.flush()
+        manager.sweep()
+        time.sleep(0.0001)
+
+
+def event_loop(server: MyServer, manager: SessionManager, duration: float):
+    loop = new_server_loop(server)
+    loop.add_timer(duration, loop.stop)
+    loop.run()
+    loop.close()
+
+
+LOOPS = {
+    "poll": poll_loop,
+    "event": event_loop
+}
+
+
+def serve(loop_name: str, duration: float, ready, cpu_times):
+    """
+    Server process: run the loop for given duration, then send the CPU time it used
+    """
+    # the channels print every message
+    sys.stdout = open(os.devnull, "w")
+    manager = SessionManager(MemoryStore())
+    server = MyServer(localaddr=ADDRESS, session_manager=manager)
+    ready.set()
+    start = time.process_time()
+    LOOPS[loop_name](server, manager, duration)
+    cpu_times.put(time.process_time() - start)
+    server.close()
+    manager.close()
+
+
+class Client:
+    """
+        Blocking client sending one request at a time
+    """
+
+    def __init__(self):
+        self.socket = socket.create_connection(ADDRESS)
+        self.socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._buffer = b""
+        # sent by the server on connection
+        self.receive()
+
+    def receive(self) -> dict:
+        while TERMINATOR not in self._buffer:
+            self._buffer += self.socket.recv(65536)
+        message, self._buffer = self._buffer.split(TERMINATOR, 1)
+        return loads(message)
+
+    def request(self, message: dict) -> dict:
+        self.socket.sendall(dumps(message) + TERMINATOR)
+        return self.receive()
+
+
+def start_server(loop_name: str, duration: float):
+    ready = multiprocessing.Event()
+    cpu_times = multiprocessing.Queue()
+    process = multiprocessing.Process(target=serve, args=(loop_name, duration, ready, cpu_times))
+    process.start()
+    ready.wait()
+    return process, cpu_times
+
+
+def bench_idle(loop_name: str) -> float:
+    """
+    :return: CPU used by the idle server, in percent of a core
+    """
+    process, cpu_times = start_server(loop_name, IDLE_TIME)
+    cpu_time = cpu_times.get()
+    process.join()
+    return 100 * cpu_time / IDLE_TIME
+
+
+def bench_latency(loop_name: str, requests: int) -> List[float]:
+    """
+    :return: sorted response times of session updates, in ms
+    """
+    process, cpu_times = start_server(loop_name, 3600.0)
+    try:
+        client = Client()
+        session_id = client.request({"action": "get_session_id"})["session_id"]
+        client.request({"action": "join_session", "session_id": session_id})
+        latencies = []
+        for update in range(requests):
+            message = {"action": "update_session", "session_id": session_id,
+                       "data": {"piece_count": update, "timer": update * 16}}
+            start = time.perf_counter()
+            response = client.request(message)
+            latencies.append((time.perf_counter() - start) * 1000)
+            assert response["status"] == "OK", response
+        client.socket.close()
+    finally:
+        process.terminate()
+        process.join()
+    return sorted(latencies)
+
+
+def main():
+    requests = int(sys.argv[1]) if len(sys.argv) > 1 else REQUESTS
+    print(f"{'loop':>6}{'idle CPU %':>12}{'p50 ms':>10}{'p99 ms':>10}")
+    for loop_name in LOOPS:
+        idle = bench_idle(loop_name)
+        latencies = bench_latency(loop_name, requests)
+        p50 = latencies[len(latencies) // 2]
+        p99 = latencies[min(len(latencies) - 1, len(latencies) * 99 // 100)]
+        print(f"{loop_name:>6}{idle:>12.1f}{p50:>10.3f}{p99:>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
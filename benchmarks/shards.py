@@ -0,0 +1,126 @@
+"""
+Benchmark session update throughput of the sharded server for growing worker counts.
+Client processes each play one session on their own connection, keeping a window of updates in flight.
+The server uses memory stores, and the client processes need cores too: the throughput can only scale with the
+worker count while there are free cores.
+
+usage: python -m benchmarks.shards [worker counts...]
+"""
+import multiprocessing
+import os
+import socket
+import sys
+import time
+
+from PodSixNet.rencode import dumps, loads
+
+from pytrisserver.sharding import ShardedServer
+
+ADDRESS = ("127.0.0.1", 4244)
+TERMINATOR = b"\0---\0"
+WORKER_COUNTS = [1, 2, 4]
+CLIENTS = 8
+# updates sent by each client, and updates waiting for their response
+UPDATES = 5000
+WINDOW = 16
+
+
+def serve(workers: int):
+    # the channels print every message, in the worker processes too
+    devnull = os.open(os.devnull, os.O_WRONLY)
+    os.dup2(devnull, sys.stdout.fileno())
+    ShardedServer(ADDRESS, workers, {"type": "memory"}).run()
+
+
+class Client:
+    def __init__(self):
+        self.socket = socket.create_connection(ADDRESS)
+        self.socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._buffer = b""
+
+    def send(self, message: dict):
+        self.socket.sendall(dumps(message) + TERMINATOR)
+
+    def receive(self) -> dict:
+        while TERMINATOR not in self._buffer:
+            self._buffer += self.socket.recv(65536)
+        message, self._buffer = self._buffer.split(TERMINATOR, 1)
+        return loads(message)
+
+    def request(self, message: dict) -> dict:
+        self.send(message)
+        return self.receive()
+
+
+def play(start, elapsed_times):
+    """
+    Client process: join a new session, then send its updates once started
+    """
+    client = Client()
+    client.send({"action": "get_session_id"})
+    # sent by the server on connection
+    client.receive()
+    session_id = client.receive()["session_id"]
+    assert client.request({"action": "join_session", "session_id": session_id})["status"] == "OK"
+    start.wait()
+    begin = time.perf_counter()
+    waiting = 0
+    for update in range(UPDATES):
+        if waiting == WINDOW:
+            assert client.receive()["status"] == "OK"
+            waiting -= 1
+        client.send({"action": "update_session", "session_id": session_id,
+                     "data": {"piece_count": update, "timer": update * 16}})
+        waiting += 1
+    for _ in range(waiting):
+        assert client.receive()["status"] == "OK"
+    elapsed_times.put(time.perf_counter() - begin)
+    client.socket.close()
+
+
+def wait_for_server():
+    while True:
+        try:
+            socket.create_connection(ADDRESS).close()
+            return
+        except ConnectionRefusedError:
+            time.sleep(0.1)
+
+
+def bench_throughput(workers: int) -> float:
+    """
+    :return: session updates per second
+    """
+    server = multiprocessing.Process(target=serve, args=(workers,))
+    server.start()
+    try:
+        wait_for_server()
+        # the clients start together once their sessions are joined
+        start = multiprocessing.Barrier(CLIENTS + 1)
+        elapsed_times = multiprocessing.Queue()
+        clients = [multiprocessing.Process(target=play, args=(start, elapsed_times)) for _ in range(CLIENTS)]
+        for client in clients:
+            client.start()
+        start.wait()
+        elapsed = max(elapsed_times.get() for _ in clients)
+        for client in clients:
+            client.join()
+    finally:
+        server.terminate()
+        server.join()
+    return CLIENTS * UPDATES / elapsed
+
+
+def main():
+    counts = [int(arg) for arg in sys.argv[1:]] or WORKER_COUNTS
+    print(f"{os.cpu_count()} cores, {CLIENTS} clients")
+    print(f"{'workers':>8}{'updates/s':>12}{'speedup':>10}")
+    base = None
+    for workers in counts:
+        throughput = bench_throughput(workers)
+        base = base or throughput
+        print(f"{workers:>8}{throughput:>12.0f}{throughput / base:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
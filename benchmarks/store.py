@@ -0,0 +1,88 @@
+"""
+Benchmark session update throughput of the server session stores, for growing session counts.
+Each store works in its own temporary directory.
+
+usage: python -m benchmarks.store [session counts...]
+"""
+import copy
+import json
+import os
+import sys
+import tempfile
+import time
+from typing import Callable, Dict
+
+from pytrisserver.journal import SessionJournal
+from pytrisserver.sessionmanager import SessionManager
+from pytrisserver.store import JournalStore, JsonFileStore, MemoryStore, SessionStore, SqliteStore
+
+SESSION_COUNTS = [10, 100, 1000]
+# updates timed for each store and session count
+UPDATES = 2000
+# the JSON file store rewrites every session on each update: fewer updates keep the benchmark short
+JSON_UPDATES = 200
+
+
+def _sqlite_store(directory: str, sessions: Dict[str, dict]) -> SessionStore:
+    store = SqliteStore(os.path.join(directory, "sessions.db"))
+    for session_id, session in sessions.items():
+        store.put(session_id, session)
+    store.commit()
+    return store
+
+
+# stores created from the sessions, the file stores load them from a sessions.json file in the directory
+STORES: Dict[str, Callable[[str, Dict[str, dict]], SessionStore]] = {
+    "memory": lambda directory, sessions: MemoryStore(sessions),
+    "json": lambda directory, sessions: JsonFileStore(os.path.join(directory, "sessions.json")),
+    "journal": lambda directory, sessions: JournalStore(SessionJournal(os.path.join(directory, "sessions.json"),
+                                                                       os.path.join(directory, "sessions.journal"))),
+    "sqlite": _sqlite_store
+}
+
+
+def new_sessions(count: int) -> Dict[str, dict]:
+    manager = SessionManager(MemoryStore())
+    for _ in range(count):
+        manager.get_new_session_id()
+    manager.verifier.shutdown()
+    return manager.store.sessions
+
+
+def bench_updates(new_store: Callable[[str, Dict[str, dict]], SessionStore], sessions: Dict[str, dict],
+                  updates: int) -> float:
+    """
+    :return: session updates per second
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        with open(os.path.join(directory, "sessions.json"), "w") as f:
+            json.dump(sessions, f)
+        manager = SessionManager(new_store(directory, copy.deepcopy(sessions)))
+        session_ids = list(sessions)
+        for session_id in session_ids:
+            manager.join_session(session_id, "player")
+        start = time.perf_counter()
+        for update in range(updates):
+            session_id = session_ids[update % len(session_ids)]
+            data = {"piece_count": update, "timer": update * 16, "holt": update % 2 == 0}
+            manager.update_session(session_id, "player", data)
+        manager.store.close()
+        elapsed = time.perf_counter() - start
+        manager.verifier.shutdown()
+    return updates / elapsed
+
+
+def main():
+    counts = [int(arg) for arg in sys.argv[1:]] or SESSION_COUNTS
+    print(f"{'sessions':>10}" + "".join(f"{name:>12}" for name in STORES) + "  (updates/s)")
+    for count in counts:
+        sessions = new_sessions(count)
+        line = f"{count:>10}"
+        for name, new_store in STORES.items():
+            updates = JSON_UPDATES if name == "json" else UPDATES
+            line += f"{bench_updates(new_store, sessions, updates):>12.0f}"
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
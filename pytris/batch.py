@@ -0,0 +1,188 @@
+"""
+Batch simulator advancing many boards at once with NumPy.
+
+Boards follow the same rules as pytris.board.Board: hard drops, line clears and perfect clear detection
+give the same results as the scalar board, one board at a time.
+"""
+from typing import Optional, Tuple
+
+import numpy as np
+
+from pytris.board import Board
+from pytris.engine import GameState
+from pytris.pieces import PIECES_ROT
+from pytris.piecetables import PIECE_MASKS
+
+# piece line offsets go from -1 (I piece vertical) to 2
+_DY_MIN = -1
+_DY_COUNT = 4
+# piece origin columns go from -2 to WIDTH - 1
+_COL_MIN = -2
+_COL_COUNT = Board.WIDTH - _COL_MIN
+
+# _MASKS[piece, rotation, col - _COL_MIN, dy - _DY_MIN] -> line bitmask, 0 if unused
+_MASKS = np.zeros((len(PIECES_ROT), 4, _COL_COUNT, _DY_COUNT), dtype=np.uint16)
+# _VALID[piece, rotation, col - _COL_MIN] -> True if the piece is inside the board horizontally
+_VALID = np.zeros((len(PIECES_ROT), 4, _COL_COUNT), dtype=bool)
+# _OFFSETS[piece, rotation, mino] -> (dy, dx)
+_OFFSETS = np.zeros((len(PIECES_ROT), 4, 4, 2), dtype=np.int16)
+_CELL = np.array(GameState.CELL, dtype=np.uint8)
+
+for _piece, _rotations in PIECES_ROT.items():
+    for _rotation in range(4):
+        # the O piece has a single rotation state
+        _base_rotation = _rotation % len(_rotations)
+        _OFFSETS[_piece, _rotation] = _rotations[_base_rotation]
+        for _col, _masks in PIECE_MASKS[_piece][_base_rotation].items():
+            _VALID[_piece, _rotation, _col - _COL_MIN] = True
+            for _dy, _mask in _masks:
+                _MASKS[_piece, _rotation, _col - _COL_MIN, _dy - _DY_MIN] = _mask
+
+
+class BatchBoards:
+    """
+        N boards stored as an (N, HEIGHT) array of line bitmasks and an (N, HEIGHT, WIDTH) array of cell types,
+        each with one active piece
+    """
+    HEIGHT = Board.HEIGHT
+    WIDTH = Board.WIDTH
+    FULL_LINE = Board.FULL_LINE
+
+    def __init__(self, size: int):
+        self.size = size
+        # one wall line above and under the board, so out of board positions collide
+        self._padded_rows = np.full((size, self.HEIGHT + 2), self.FULL_LINE, dtype=np.uint16)
+        self._padded_rows[:, 1:-1] = 0
+        self.colors = np.zeros((size, self.HEIGHT, self.WIDTH), dtype=np.uint8)
+
+        # active pieces
+        self.pieces = np.zeros(size, dtype=np.int16)
+        self.rotations = np.zeros(size, dtype=np.int16)
+        self.lines = np.zeros(size, dtype=np.int16)
+        self.cols = np.zeros(size, dtype=np.int16)
+
+        self._index = np.arange(size)
+
+    @property
+    def rows(self) -> np.ndarray:
+        """
+        (N, HEIGHT) line bitmasks (view)
+        """
+        return self._padded_rows[:, 1:-1]
+
+    @classmethod
+    def from_boards(cls, boards) -> "BatchBoards":
+        batch = cls(len(boards))
+        for i, board in enumerate(boards):
+            batch.rows[i] = board.rows
+            batch.colors[i] = board.colors
+        return batch
+
+    def to_board(self, index: int) -> Board:
+        return Board(self.colors[index].tolist())
+
+    def set_pieces(self, pieces, rotations, lines, cols):
+        """
+        Set the active pieces, given by their type, rotation and origin (see pytris.piecetables)
+        """
+        self.pieces[:] = pieces
+        self.rotations[:] = rotations
+        self.lines[:] = lines
+        self.cols[:] = cols
+
+    def spawn_pieces(self, pieces, rotations=0, cols: Optional[np.ndarray] = None):
+        """
+        Set the active pieces at their spawn position, with given rotations and columns (spawn column if not given)
+        """
+        pieces = np.asarray(pieces)
+        spawn = np.array([GameState.SPAWN_POS[piece] for piece in range(len(PIECES_ROT))], dtype=np.int16)
+        self.set_pieces(pieces, rotations, spawn[pieces, 0], spawn[pieces, 1] if cols is None else cols)
+
+    def _piece_masks(self, cols: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        col_index = np.clip(cols - _COL_MIN, 0, _COL_COUNT - 1)
+        valid = _VALID[self.pieces, self.rotations, col_index] & (cols >= _COL_MIN) & (cols < self.WIDTH)
+        return _MASKS[self.pieces, self.rotations, col_index], valid
+
+    def fits(self, line_offset: int = 0, col_offset: int = 0) -> np.ndarray:
+        """
+        :return: (N,) True where the active piece, shifted by given offsets, fits in the board
+        """
+        masks, valid = self._piece_masks(self.cols + col_offset)
+        line_index = self.lines[:, None] + line_offset + np.arange(_DY_MIN, _DY_MIN + _DY_COUNT) + 1
+        line_index = np.clip(line_index, 0, self.HEIGHT + 1)
+        board_lines = np.take_along_axis(self._padded_rows, line_index, axis=1)
+        return valid & ~np.any(board_lines & masks, axis=1)
+
+    def drop_distances(self) -> np.ndarray:
+        """
+        :return: (N,) number of lines each active piece can go down (pieces must fit in their board)
+        """
+        masks, _ = self._piece_masks(self.cols)
+        distances = self.HEIGHT + 1
+        # lines under each piece, starting at its first line offset
+        line_index = self.lines[:, None] + np.arange(distances + _DY_COUNT - 1) + _DY_MIN + 1
+        line_index = np.clip(line_index, 0, self.HEIGHT + 1)
+        window = np.take_along_axis(self._padded_rows, line_index, axis=1)
+        collide = np.zeros((self.size, distances), dtype=bool)
+        for dy in range(_DY_COUNT):
+            collide |= (window[:, dy:dy + distances] & masks[:, dy, None]) != 0
+        # first colliding distance, minus one. There is always a collision with the floor
+        return np.argmax(collide, axis=1) - 1
+
+    def lock_pieces(self, where: Optional[np.ndarray] = None):
+        """
+        Write the active pieces in the boards (only where given mask is True)
+        """
+        index = self._index if where is None else self._index[where]
+        pieces = self.pieces[index]
+        rotations = self.rotations[index]
+        masks, _ = self._piece_masks(self.cols)
+        line_index = self.lines[index, None] + np.arange(_DY_MIN, _DY_MIN + _DY_COUNT) + 1
+        line_index = np.clip(line_index, 0, self.HEIGHT + 1)
+        # each board gets 4 distinct lines, unused ones have an empty mask
+        self._padded_rows[index[:, None], line_index] |= masks[index]
+
+        offsets = _OFFSETS[pieces, rotations]
+        cell_lines = self.lines[index, None] + offsets[:, :, 0]
+        cell_cols = self.cols[index, None] + offsets[:, :, 1]
+        self.colors[index[:, None], cell_lines, cell_cols] = _CELL[pieces][:, None]
+
+    def clear_lines(self) -> np.ndarray:
+        """
+            Clear full lines of every board
+            :return: (N,) number of cleared lines
+        """
+        rows = self.rows
+        full = rows == self.FULL_LINE
+        cleared = full.sum(axis=1)
+        if not cleared.any():
+            return cleared
+        # full lines first, other lines keep their order
+        order = np.argsort(~full, axis=1, kind="stable")
+        empty = np.arange(self.HEIGHT)[None, :] < cleared[:, None]
+        new_rows = np.take_along_axis(rows, order, axis=1)
+        new_rows[empty] = 0
+        rows[:] = new_rows
+        new_colors = np.take_along_axis(self.colors, order[:, :, None], axis=1)
+        new_colors[empty] = 0
+        self.colors[:] = new_colors
+        return cleared
+
+    def is_empty(self) -> np.ndarray:
+        """
+        :return: (N,) True where the board is empty
+        """
+        return ~np.any(self.rows, axis=1)
+
+    def hard_drop(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+            Hard drop and lock the active pieces, then clear lines.
+            Boards where the active piece does not fit are left untouched.
+            :return: (N,) arrays: piece placed, number of cleared lines, perfect clear
+        """
+        placed = self.fits()
+        self.lines += np.where(placed, self.drop_distances(), 0).astype(self.lines.dtype)
+        self.lock_pieces(placed)
+        cleared = self.clear_lines()
+        perfect = placed & (cleared > 0) & self.is_empty()
+        return placed, cleared, perfect
@@ -0,0 +1,266 @@
+"""
+Bitboard representation of the playing field
+"""
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from pytris import zobrist
+
+
+class Board:
+    """
+        Playing field stored as one integer bitmask per line (bit n is set if column n is used),
+        with a parallel colour plane keeping the cell type of each cell for rendering and serialization.
+
+        Collision tests only use the bitmasks. Column heights, line fill counts and the number of used cells
+        are kept up to date on each change, for constant time drop distance, full line and empty board tests.
+
+        The Zobrist hash of the used cells (cell types are not part of it) is also kept up to date.
+
+        The version counter goes up on each change, for renderers caching the board.
+    """
+    HEIGHT = 22
+    WIDTH = 10
+    FULL_LINE = (1 << WIDTH) - 1
+    # same value as Cell.EMPTY, without depending on pygame
+    EMPTY = 0
+
+    CELL_KEYS = zobrist.cell_keys(HEIGHT, WIDTH)
+    LINE_KEYS = zobrist.line_key_tables(CELL_KEYS)
+
+    def __init__(self, grid: Optional[List[List[int]]] = None):
+        # line bitmasks, from top (0) to bottom (HEIGHT - 1)
+        self.rows: List[int] = [0] * self.HEIGHT
+        # cell types, same layout as the JSON session grid
+        self.colors: List[List[int]] = [[self.EMPTY] * self.WIDTH for _ in range(self.HEIGHT)]
+        # column surface heights: number of lines from the bottom to the highest used cell, 0 if the column is empty
+        self.heights: List[int] = [0] * self.WIDTH
+        # number of used cells of each line
+        self.line_counts: List[int] = [0] * self.HEIGHT
+        self.used_count = 0
+        self._full_lines = 0
+        self.hash = 0
+        self.version = 0
+        if grid is not None:
+            self.load(grid)
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[int]) -> "Board":
+        """
+        Build a board from line bitmasks only (cell types stay empty), for searches not needing them
+        """
+        board = cls()
+        board.rows = list(rows)
+        board._update_counts()
+        return board
+
+    def load(self, grid: List[List[int]]):
+        """
+        Load a list-of-lists grid (JSON session format)
+        """
+        self.colors = [list(line) for line in grid]
+        self.rows = [self._line_mask(line) for line in self.colors]
+        self._update_counts()
+        self.version += 1
+
+    @classmethod
+    def hash_rows(cls, rows: Iterable[int]) -> int:
+        """
+        :return: Zobrist hash of the line bitmasks, same as the hash of a board with these lines
+        """
+        key = 0
+        for line, row in enumerate(rows):
+            if row:
+                key ^= zobrist.line_key(cls.LINE_KEYS[line], row)
+        return key
+
+    def _update_counts(self):
+        self.hash = self.hash_rows(self.rows)
+        self.line_counts = [bin(row).count("1") for row in self.rows]
+        self.used_count = sum(self.line_counts)
+        self._full_lines = self.line_counts.count(self.WIDTH)
+        self._update_heights()
+
+    def _update_heights(self):
+        self.heights = [0] * self.WIDTH
+        seen = 0
+        for line, row in enumerate(self.rows):
+            new = row & ~seen
+            while new:
+                bit = new & -new
+                new ^= bit
+                self.heights[bit.bit_length() - 1] = self.HEIGHT - line
+            seen |= row
+            if seen == self.FULL_LINE:
+                break
+
+    def to_grid(self) -> List[List[int]]:
+        """
+        :return: list-of-lists grid (JSON session format)
+        """
+        return self.colors
+
+    def _line_mask(self, line: List[int]) -> int:
+        mask = 0
+        for col, cell_type in enumerate(line):
+            if cell_type != self.EMPTY:
+                mask |= 1 << col
+        return mask
+
+    def get(self, line: int, col: int) -> int:
+        """
+        :return: cell type at given position (position must be inside the board)
+        """
+        return self.colors[line][col]
+
+    def is_used(self, pos: Tuple[int, int]) -> bool:
+        """
+        :return: True if the position is outside the board or not empty
+        """
+        line, col = pos
+        if 0 <= line < self.HEIGHT and 0 <= col < self.WIDTH:
+            return (self.rows[line] >> col) & 1 == 1
+        return True
+
+    @staticmethod
+    def to_masks(cells: Iterable[Tuple[int, int]]) -> Dict[int, int]:
+        """
+        Convert cell positions to a {line: bitmask} mapping.
+        Positions must have their columns inside the board.
+        """
+        masks = {}
+        for line, col in cells:
+            masks[line] = masks.get(line, 0) | (1 << col)
+        return masks
+
+    def fits_masks(self, masks: Dict[int, int], d_line: int = 0, d_col: int = 0) -> bool:
+        """
+        Test if the piece described by masks (see to_masks), shifted by (d_line, d_col), is inside the board
+        and does not collide with used cells
+        """
+        rows = self.rows
+        for line, mask in masks.items():
+            line += d_line
+            if not 0 <= line < self.HEIGHT:
+                return False
+            if d_col >= 0:
+                mask <<= d_col
+                if mask > self.FULL_LINE:
+                    return False
+            else:
+                if mask & ((1 << -d_col) - 1):
+                    return False
+                mask >>= -d_col
+            if rows[line] & mask:
+                return False
+        return True
+
+    def fits(self, cells: Iterable[Tuple[int, int]]) -> bool:
+        """
+        Test if all given positions are inside the board and empty
+        """
+        rows = self.rows
+        for line, col in cells:
+            if not (0 <= line < self.HEIGHT and 0 <= col < self.WIDTH) or (rows[line] >> col) & 1:
+                return False
+        return True
+
+    def drop_distance(self, cells: Iterable[Tuple[int, int]]) -> int:
+        """
+        :return: number of lines the given cells can go down before hitting something
+        """
+        cells = list(cells)
+        # lowest cell of each column
+        lowest = {}
+        for line, col in cells:
+            if lowest.get(col, -1) < line:
+                lowest[col] = line
+        distance = self.HEIGHT
+        for col, line in lowest.items():
+            surface = self.HEIGHT - self.heights[col]
+            if line >= surface:
+                # under an overhang: go down one line at a time
+                return self._slow_drop_distance(cells)
+            distance = min(distance, surface - line - 1)
+        return distance
+
+    def _slow_drop_distance(self, cells: List[Tuple[int, int]]) -> int:
+        masks = self.to_masks(cells)
+        distance = 0
+        while self.fits_masks(masks, distance + 1):
+            distance += 1
+        return distance
+
+    def set_cells(self, cells: Iterable[Tuple[int, int]], cell_type: int):
+        """
+        Set the type of the cells at given positions
+        """
+        self.version += 1
+        for line, col in cells:
+            self.colors[line][col] = cell_type
+            bit = 1 << col
+            was_used = self.rows[line] & bit
+            if cell_type == self.EMPTY:
+                if not was_used:
+                    continue
+                self.rows[line] &= ~bit
+                self.hash ^= self.CELL_KEYS[line][col]
+                if self.line_counts[line] == self.WIDTH:
+                    self._full_lines -= 1
+                self.line_counts[line] -= 1
+                self.used_count -= 1
+                if self.heights[col] == self.HEIGHT - line:
+                    self.heights[col] = next((self.HEIGHT - lower for lower in range(line + 1, self.HEIGHT)
+                                              if self.rows[lower] & bit), 0)
+            elif not was_used:
+                self.rows[line] |= bit
+                self.hash ^= self.CELL_KEYS[line][col]
+                self.line_counts[line] += 1
+                self.used_count += 1
+                if self.line_counts[line] == self.WIDTH:
+                    self._full_lines += 1
+                self.heights[col] = max(self.heights[col], self.HEIGHT - line)
+
+    def clear_lines(self) -> int:
+        """
+            Clear full lines and return the number of cleared lines
+        """
+        if not self._full_lines:
+            return 0
+        full = [line for line in range(self.HEIGHT) if self.line_counts[line] == self.WIDTH]
+        self._update_hash_for_clear(full)
+        cleared = []
+        for line in reversed(full):
+            self.rows.pop(line)
+            self.line_counts.pop(line)
+            cleared.append(self.colors.pop(line))
+        for line in cleared:
+            for i in range(len(line)):
+                line[i] = self.EMPTY
+        self.rows[0:0] = [0] * len(cleared)
+        self.line_counts[0:0] = [0] * len(cleared)
+        self.colors[0:0] = cleared
+        self.used_count -= len(cleared) * self.WIDTH
+        self._full_lines = 0
+        self._update_heights()
+        self.version += 1
+        return len(cleared)
+
+    def _update_hash_for_clear(self, full: List[int]):
+        """
+        Update the hash for clearing given full lines: cleared lines go away, lines above them go down
+        """
+        # lines above the highest used cell are empty and do not change the hash
+        top = self.HEIGHT - max(self.heights)
+        # number of cleared lines under the current line
+        shift = 0
+        for line in range(full[-1], top - 1, -1):
+            row = self.rows[line]
+            if row == self.FULL_LINE:
+                shift += 1
+                self.hash ^= zobrist.line_key(self.LINE_KEYS[line], row)
+            elif row:
+                self.hash ^= zobrist.line_key(self.LINE_KEYS[line], row) \
+                             ^ zobrist.line_key(self.LINE_KEYS[line + shift], row)
+
+    def is_empty(self) -> bool:
+        return self.used_count == 0
@@ -1,6 +1,8 @@
 """
 Cell
 """
+from typing import Dict, Tuple
+
 import pygame
 
 
@@ -32,6 +34,9 @@ class Cell(pygame.sprite.Sprite):
 
     BORDER_COLOR = (60, 60, 60)
 
+    # (cell type, size) -> pre-rendered cell
+    _tiles: Dict[Tuple[int, int], pygame.Surface] = {}
+
     def __init__(self, cell_type=0):
         super().__init__()
         self._cell_type = cell_type
@@ -56,3 +61,17 @@ class Cell(pygame.sprite.Sprite):
         """
         pygame.draw.rect(surface, self.COLOR[self.cell_type], rect_pos)
         pygame.draw.rect(surface, self.BORDER_COLOR, rect_pos, 1)
+
+    @classmethod
+    def tile(cls, cell_type: int, size: int) -> pygame.Surface:
+        """
+            Pre-rendered cell of given type, size x size pixels border included (same as draw)
+        """
+        tile = cls._tiles.get((cell_type, size))
+        if tile is None:
+            tile = pygame.Surface((size, size))
+            if pygame.display.get_surface() is not None:
+                tile = tile.convert()
+            Cell(cell_type).draw(tile, pygame.Rect(0, 0, size, size))
+            cls._tiles[(cell_type, size)] = tile
+        return tile
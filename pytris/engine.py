@@ -0,0 +1,630 @@
+"""
+Game rules engine, without any display, sound or network dependency.
+
+Manage piece movement, hold, locking, scoring...
+"""
+from typing import List, Tuple
+
+from pytris.board import Board
+from pytris.gamemode import *
+from pytris.keys import KEY_BITS, Key, KeyState
+from pytris.pieces import *
+from pytris.piecetables import fits, piece_cells, try_rotate
+from pytris.sessionstate import SessionState
+
+# DAS, ARR and SDF settings are given in 60 Hz frames, and applied in milliseconds
+FRAME_TIME = 1000 / 60
+# frame times are whole milliseconds, so repeat delays are counted as reached within this margin
+TIME_TOLERANCE = 1
+
+_HD_BIT = KEY_BITS[Key.HD_KEY]
+_SD_BIT = KEY_BITS[Key.SD_KEY]
+_LEFT_BIT = KEY_BITS[Key.LEFT_KEY]
+_RIGHT_BIT = KEY_BITS[Key.RIGHT_KEY]
+_HOLD_BIT = KEY_BITS[Key.HOLD_KEY]
+_ROT_CW_BIT = KEY_BITS[Key.ROT_CW_KEY]
+_ROT_CCW_BIT = KEY_BITS[Key.ROT_CCW_KEY]
+_ROT_180_BIT = KEY_BITS[Key.ROT_180_KEY]
+_ROT_BITS = _ROT_CW_BIT | _ROT_CCW_BIT | _ROT_180_BIT
+
+MOVE_ROT = "rotation"
+MOVE_KICK = "wall_kick"
+MOVE_TST_KICK = "tst_fin_kick"
+MOVE_TRANS = "translation"
+
+# events emitted by the engine
+EVENT_ROTATE = "rotate"
+EVENT_DAS = "das"
+EVENT_ARR = "arr"
+EVENT_HIT = "hit"
+EVENT_HOLD = "hold"
+EVENT_SOFTDROP = "softdrop"
+# piece locked without clearing lines
+EVENT_LOCK = "lock"
+EVENT_CLEAR = "clear"
+EVENT_QUAD = "quad"
+EVENT_TSPIN = "tspin"
+EVENT_PERFECT_CLEAR = "perfect_clear"
+# emitted after every lock, once the board and stats are updated
+EVENT_PIECE_LOCKED = "piece_locked"
+EVENT_TOP_OUT = "top_out"
+
+
+def _corners(cells: List[Tuple[int, int]]) -> List[Tuple[int, int]]:
+    center = cells[1]
+    return [
+        (center[0] - 1, center[1] - 1),
+        (center[0] - 1, center[1] + 1),
+        (center[0] + 1, center[1] - 1),
+        (center[0] + 1, center[1] + 1)
+    ]
+
+
+def is_tspin(board: Board, piece: int, rotation: int, cells: List[Tuple[int, int]], last_move: str) -> bool:
+    """
+    test if we have a tspin
+
+    we need a T-piece that was rotated or kicked
+    3 or its 4 corners need to be filled
+    and 2 of its front corners need to be filled (except for tst and fin kicks)
+    """
+    if piece != T_PIECE or last_move == MOVE_TRANS:
+        return False
+    corners = _corners(cells)
+    _is_used = board.is_used
+
+    # 3 corners rule
+    used = sum(_is_used(corner) for corner in corners)
+    if used < 3:
+        return False
+
+    if last_move == MOVE_TST_KICK:
+        # TST and fins are T-spins event without the 2 corners rule
+        return True
+
+    # 2 front corners rule
+    if rotation == 0 and _is_used(corners[0]) and _is_used(corners[1]):
+        return True
+    if rotation == 1 and _is_used(corners[1]) and _is_used(corners[3]):
+        return True
+    if rotation == 2 and _is_used(corners[2]) and _is_used(corners[3]):
+        return True
+    if rotation == 3 and _is_used(corners[0]) and _is_used(corners[2]):
+        return True
+
+    return False
+
+
+def is_tspin_mini(board: Board, piece: int, cells: List[Tuple[int, int]], last_move: str) -> bool:
+    """
+    test if we have a tspin mini
+
+    need a T piece that was kicked
+    3 of its 4 corners need to be filled
+    is not a T-spin (not tested, so this will return True also for T-spins)
+    """
+    if piece != T_PIECE or last_move != MOVE_KICK:
+        return False
+    # 3 corners rule
+    return sum(board.is_used(corner) for corner in _corners(cells)) >= 3
+
+
+class GameState:
+    """
+        Player game state: current piece position, movement counters, locking and scoring
+    """
+
+    CELL = [1, 2, 3, 4, 5, 6, 7]
+    SPAWN_POS = {
+        I_PIECE: (1, 3),
+        J_PIECE: (0, 3),
+        L_PIECE: (0, 3),
+        O_PIECE: (0, 4),
+        S_PIECE: (0, 3),
+        Z_PIECE: (0, 3),
+        T_PIECE: (0, 3)
+    }
+
+    SCORE_TABLE = {
+        "T-spin": 400,
+        "T-spin mini": 100,
+        "T-spin Single": 800,
+        "T-spin Double": 1200,
+        "T-spin Triple": 1600,
+        "T-spin mini Single": 200,
+        "T-spin mini Double": 1200,
+        "Single": 100,
+        "Double": 300,
+        "Triple": 500,
+        "Quad": 800,
+        "Perfect Clear Single": 800,
+        "Perfect Clear Double": 1200,
+        "Perfect Clear Triple": 1800,
+        "Perfect Clear Quad": 2000,
+        "B2B Perfect Clear Quad": 3200,
+        "B2B": 1.5,
+        "HD": 1,
+        "SD": 2,
+        "Combo": 50
+    }
+
+    ALLOWED_WIGGLES = 5
+    UNMOVING_TICKS_LOCK = 4
+    MOVING_TICKS_LOCK = 8
+
+    def __init__(self, session: SessionState, game_mode: int, das: int, arr: float, sdf: float):
+        self.game_mode = game_mode
+        self.session = session
+
+        # if current piece is not movable by the player
+        self.locked = False
+
+        self._topped_out = False
+
+        # das trigger, in frames. start using arr once the direction is held for das frames
+        self.das: int = das
+
+        # arr == 0 -> immediate
+        # arr > 0 -> move 1 block each arr frames (several blocks per frame if arr < 1)
+        self.arr: float = arr
+        # time since last auto repeat move, in milliseconds
+        self._arr_load = 0
+
+        # sd == 0 -> immediate
+        # sd > 0 -> move 1 block each sd frames (several blocks per frame if sd < 1)
+        self.sd: float = sdf
+        # time since last soft drop move, in milliseconds
+        self._sd_load = 0
+
+        # position of the current piece's minos
+        self._cells: List[Tuple[int, int]] = []
+        # origin of the current piece (see pytris.piecetables)
+        self._line = 0
+        self._col = 0
+        # number of wiggles allowed at the bottom of the board before locking piece
+        self._wiggles_left = self.ALLOWED_WIGGLES
+        # current height of piece (height of the "highest" mino, so the lowest on the board)
+        self._current_height = 1
+        # max height reached with current piece (height is same notion as current_height)
+        self._max_height = 1
+        # rotation state of current piece
+        # (0 - initial state, 1 - CW from initial, 2 - 180 from initial, 3 CCW from initial)
+        self._rotation = 0
+        # time the current direction is held, in milliseconds. Piece start scrolling once it reaches DAS
+        self._das_load = 0
+        # direction held by the player. 0 none, negative left, positive right
+        self._held_dir = 0
+        # last move type (rotation, kick, tst kick, translation)
+        self._last_move = None
+        # if the piece is unmoving at the bottom, we accept multiple locking ticks before locking
+        self._locking_tick_unmoving_lock = self.UNMOVING_TICKS_LOCK
+        # if the piece is moving at the bottom, we accept multiple locking ticks before locking
+        self._locking_tick_moving_lock = self.MOVING_TICKS_LOCK
+        # last piece translation direction. 0 unmoving, negative left, positive right
+        self._last_dir = 0
+        # gravity and lock ticks received but not applied yet
+        self._pending_gravity = False
+        self._pending_lock_tick = False
+
+        # result of the last lock (clear type with back-to-back, perfect clear)
+        self.last_clear_text = ""
+        self.last_perfect = False
+
+        self._events: List[str] = []
+
+    @property
+    def cells(self) -> List[Tuple[int, int]]:
+        """
+        Positions of the current piece's minos
+        """
+        return self._cells
+
+    @property
+    def rotation(self) -> int:
+        return self._rotation
+
+    @property
+    def topped_out(self):
+        return self._topped_out
+
+    @topped_out.setter
+    def topped_out(self, topout):
+        if not self._topped_out and topout:
+            self._events.append(EVENT_TOP_OUT)
+        self._topped_out = topout
+
+    def pop_events(self) -> List[str]:
+        """
+        :return: events emitted since last call
+        """
+        events = self._events
+        self._events = []
+        return events
+
+    def reset(self):
+        self._das_load = 0
+        self._held_dir = 0
+        self._arr_load = 0
+        self._sd_load = 0
+        self._topped_out = False
+        self._pending_gravity = False
+        self._pending_lock_tick = False
+        self.last_clear_text = ""
+        self.last_perfect = False
+
+    def start(self):
+        self.session.set_next_in_queue(start=True)
+        self.spawn_piece()
+
+    def game_finished(self) -> bool:
+        if self.topped_out:
+            return True
+        if self.game_mode == SPRINT_MODE:
+            return self.session.lines_cleared >= 40
+        if self.game_mode == ULTRA_MODE:
+            return 120000 - self.session.timer <= 0
+        return False
+
+    def spawn_cells(self, piece_type: int) -> List[Tuple[int, int]]:
+        return piece_cells(piece_type, 0, *self.SPAWN_POS[piece_type])
+
+    def spawn_piece(self) -> bool:
+        """
+        Try to spawn the tetromino piece in the spawn area. Succeed iif all needed cells are empty
+        :return: True if succeeded, False otherwise
+        """
+        piece = self.session.current_piece
+        if not fits(self.session.board, piece, 0, *self.SPAWN_POS[piece]):
+            self.topped_out = True
+            return False
+        if self.game_mode == PC_MODE and self.session.pieces_since_pc >= 10:
+            self.topped_out = True
+            return False
+        self._line, self._col = self.SPAWN_POS[piece]
+        self._cells = self.spawn_cells(piece)
+        self.locked = False
+        self._current_height = 1
+        self._max_height = 1
+        self._rotation = 0
+        self._last_move = None
+        self._locking_tick_unmoving_lock = self.UNMOVING_TICKS_LOCK
+        self._locking_tick_moving_lock = self.MOVING_TICKS_LOCK
+        return True
+
+    def _move(self, left: int, top: int) -> bool:
+        """
+            Move the current piece if there is no border or other cells in the way.
+            Go down first, then sideways
+            :return: True if the piece moved
+        """
+        board = self.session.board
+        piece = self.session.current_piece
+        line, col = self._line, self._col
+
+        correct_top = 0
+        if top > 0:
+            correct_top = min(top, board.drop_distance(self._cells))
+        elif top < 0:
+            while correct_top > top and fits(board, piece, self._rotation, line + correct_top - 1, col):
+                correct_top -= 1
+
+        correct_left = 0
+        if left != 0:
+            iteration = left // abs(left)
+            while abs(correct_left) < abs(left) and \
+                    fits(board, piece, self._rotation, line + correct_top, col + correct_left + iteration):
+                correct_left += iteration
+
+        if correct_top == 0 and correct_left == 0:
+            return False
+
+        self._line += correct_top
+        self._col += correct_left
+        self._cells = piece_cells(piece, self._rotation, self._line, self._col)
+        return True
+
+    def _is_on_top_of_something(self) -> bool:
+        return not fits(self.session.board, self.session.current_piece, self._rotation, self._line + 1, self._col)
+
+    def ghost_cells(self) -> List[Tuple[int, int]]:
+        """
+        :return: positions of the current piece's minos after a hard drop
+        """
+        distance = self.session.board.drop_distance(self._cells)
+        return [(line + distance, col) for line, col in self._cells]
+
+    @staticmethod
+    def _get_max_height(*cells) -> int:
+        return max(cell_pos[0] for cell_pos in cells)
+
+    def _rotate(self, rotation: int):
+        piece = self.session.current_piece
+        if piece == O_PIECE:
+            return
+
+        new_rotation = (self._rotation + rotation) % 4
+        kick = try_rotate(self.session.board, piece, self._rotation, new_rotation, self._line, self._col)
+        if kick is None:
+            return
+        correct_mode, line, col = kick
+
+        if correct_mode == 0:
+            self._last_move = MOVE_ROT
+        elif self._rotation in (0, 2):
+            # possible TST or fin kicks
+            if correct_mode == 4:
+                self._last_move = MOVE_TST_KICK
+            else:
+                self._last_move = MOVE_KICK
+        else:
+            self._last_move = MOVE_KICK
+
+        self._line, self._col = line, col
+        self._cells = piece_cells(piece, new_rotation, line, col)
+        self._rotation = new_rotation
+        self._events.append(EVENT_ROTATE)
+
+    def is_tspin(self) -> bool:
+        return is_tspin(self.session.board, self.session.current_piece, self._rotation, self._cells, self._last_move)
+
+    def is_tspin_mini(self) -> bool:
+        return is_tspin_mini(self.session.board, self.session.current_piece, self._cells, self._last_move)
+
+    @staticmethod
+    def _hit_wall(cells) -> int:
+        """
+            -1 hit left wall, 0 don't hit wall, +1 hit right wall
+        """
+        for cell in cells:
+            if cell[1] == 0:
+                return -1
+            if cell[1] == Board.WIDTH - 1:
+                return 1
+        return 0
+
+    @staticmethod
+    def _repeat(load: float, interval: float) -> Tuple[int, float]:
+        """
+        :return: number of repeats of given interval in the loaded time, time left
+        """
+        repeats = int((load + TIME_TOLERANCE) // interval)
+        return repeats, load - repeats * interval
+
+    def _translate(self, keys: KeyState, time_delta):
+        top = 0
+        direction = 0
+        # keys tapped during the frame are pressed without being held anymore
+        held = keys.pressing | keys.pressed
+        if held & _SD_BIT:
+            top += 1
+        if held & _LEFT_BIT:
+            direction -= 1
+        if held & _RIGHT_BIT:
+            direction += 1
+
+        used_das = False
+        used_arr = False
+
+        left = 0
+        if direction != 0:
+            if direction != self._held_dir:
+                # new press or direction change: move once, then charge DAS
+                used_das = self._held_dir == 0
+                self._das_load = 0
+                self._arr_load = 0
+                left = direction
+            else:
+                das_time = self.das * FRAME_TIME
+                charging = self._das_load + TIME_TOLERANCE < das_time
+                self._das_load += time_delta
+                if self._das_load + TIME_TOLERANCE >= das_time:
+                    if self.arr == 0:
+                        left = direction * Board.WIDTH
+                    else:
+                        arr_time = self.arr * FRAME_TIME
+                        if charging:
+                            # first auto repeat move as soon as DAS is charged
+                            self._arr_load = arr_time + max(0.0, self._das_load - das_time)
+                        else:
+                            self._arr_load += time_delta
+                        repeats, self._arr_load = self._repeat(self._arr_load, arr_time)
+                        left = direction * repeats
+                        used_arr = repeats > 0
+        else:
+            self._das_load = 0
+            self._arr_load = 0
+        self._held_dir = direction
+        # moving, or ready to move, horizontally
+        self._last_dir = direction if left != 0 or self._das_load + TIME_TOLERANCE >= self.das * FRAME_TIME else 0
+
+        if top > 0:
+            if self.sd == 0:
+                top = top * 30
+            else:
+                self._sd_load += time_delta
+                top, self._sd_load = self._repeat(self._sd_load, self.sd * FRAME_TIME)
+        else:
+            self._sd_load = 0
+        old_cells = self._cells
+        if self._move(left, top):
+            if used_das:
+                self._events.append(EVENT_DAS)
+            elif used_arr:
+                self._events.append(EVENT_ARR)
+            if self._hit_wall(old_cells) != self._hit_wall(self._cells):
+                self._events.append(EVENT_HIT)
+            self._last_move = MOVE_TRANS
+
+    def update(self, keys: KeyState, time_delta):
+        """
+            Update piece position following user input
+            :param keys: key state of the frame
+            :param time_delta: time since last update in milliseconds
+        """
+        self.session.update_time(time_delta)
+
+        if self.locked:
+            return
+
+        if keys.pressed & _HOLD_BIT and not self.session.holt:
+            if self.session.hold_piece is None:
+                self.session.hold_piece = self.session.current_piece
+                self.session.set_next_in_queue()
+            else:
+                self.session.hold_piece, self.session.current_piece = \
+                    self.session.current_piece, self.session.hold_piece
+            self.session.holt = True
+            self._events.append(EVENT_HOLD)
+            self.spawn_piece()
+            return
+
+        if keys.pressed & _HD_BIT:
+            self._move(0, Board.HEIGHT)
+            height = self._get_max_height(*self._cells)
+            self.session.score += self.SCORE_TABLE["HD"] * (height - self._current_height)
+            self.locked = True
+            return
+
+        # rotate only if a single rotation key was pressed
+        rotation = keys.pressed & _ROT_BITS
+        if rotation == _ROT_CW_BIT:
+            self._rotate(1)
+        elif rotation == _ROT_CCW_BIT:
+            self._rotate(-1)
+        elif rotation == _ROT_180_BIT:
+            self._rotate(2)
+
+        self._translate(keys, time_delta)
+
+        new_height = self._get_max_height(*self._cells)
+        if new_height > self._max_height:
+            self.session.score += self.SCORE_TABLE["SD"] * (new_height - self._current_height)
+            self._max_height = new_height
+            self._wiggles_left = self.ALLOWED_WIGGLES
+            self._locking_tick_unmoving_lock = self.UNMOVING_TICKS_LOCK
+            self._locking_tick_moving_lock = self.MOVING_TICKS_LOCK
+            if self._is_on_top_of_something():
+                self._events.append(EVENT_SOFTDROP)
+        elif new_height < self._current_height:
+            self._wiggles_left -= 1
+        elif self._is_on_top_of_something() and self._wiggles_left == 0:
+            self.locked = True
+
+        self._current_height = new_height
+
+    def clear_lines(self):
+        """
+            Actions to do after a piece was locked
+        """
+        # write locked piece in grid
+        self.session.board.set_cells(self._cells, self.CELL[self.session.current_piece])
+
+        self.session.pieces_since_pc += 1
+        tspin = self.is_tspin()
+        mini = False if tspin else self.is_tspin_mini()
+        cleared_lines = self.session.board.clear_lines()
+        perfect = self.session.board.is_empty()
+        self.session.lines_cleared += cleared_lines
+
+        if cleared_lines > 0:
+            self.session.combo += 1
+        else:
+            self.session.combo = -1
+        if cleared_lines == 4 or (cleared_lines > 0 and (tspin or mini)):
+            self.session.back_to_back += 1
+        elif cleared_lines > 0:
+            self.session.back_to_back = -1
+        clear_type = (
+            f"{'T-spin ' if tspin else ''}"
+            f"{'T-spin mini ' if mini else ''}"
+            f"{['', 'Single', 'Double', 'Triple', 'Quad'][cleared_lines]}").strip()
+
+        if clear_type:
+            self.session.stats[clear_type.strip()] += 1
+            self.session.stats["Max Back-to-Back"] = max(self.session.stats["Max Back-to-Back"],
+                                                         self.session.back_to_back)
+            self.session.stats["Max combo"] = max(self.session.stats["Max combo"], self.session.combo)
+
+            score_to_add = 0
+            combo_add = self.SCORE_TABLE["Combo"] if self.session.combo > 0 else 0
+            if perfect:
+                score_key = f"{'B2B ' if self.session.back_to_back > 0 else ''}Perfect Clear {clear_type}"
+                score_to_add = self.SCORE_TABLE[score_key]
+                self._events.append(EVENT_PERFECT_CLEAR)
+            else:
+                b2b_mult = self.SCORE_TABLE["B2B"] if self.session.back_to_back > 0 else 1
+                score_to_add = b2b_mult * self.SCORE_TABLE[clear_type]
+                if cleared_lines == 4:
+                    self._events.append(EVENT_QUAD)
+                elif tspin or mini:
+                    self._events.append(EVENT_TSPIN)
+                elif cleared_lines > 0:
+                    self._events.append(EVENT_CLEAR)
+            self.session.score += int((score_to_add + combo_add) * self.session.level)
+            if perfect:
+                self.session.stats["Perfect Clears"] += 1
+                self.session.pieces_since_pc = 0
+                self.session.successive_pc += 1
+                self.session.max_successive_pc = max(self.session.max_successive_pc, self.session.successive_pc)
+        else:
+            self._events.append(EVENT_LOCK)
+            if self.session.pieces_since_pc >= 10:
+                self.session.successive_pc = 0
+
+        back_to_back = f" {'Back-to-back ' + str(self.session.back_to_back) if self.session.back_to_back > 0 else ''}"
+        self.last_clear_text = (clear_type + back_to_back).strip()
+        self.last_perfect = perfect
+        self.session.current_piece = None
+        self._events.append(EVENT_PIECE_LOCKED)
+
+    def go_down(self):
+        """
+            GODOWN with gravity
+        """
+        self._move(0, 1)
+        new_height = self._get_max_height(*self._cells)
+        if new_height != self._current_height:
+            if new_height > self._max_height:
+                self._max_height = new_height
+                self._wiggles_left = self.ALLOWED_WIGGLES
+            self._current_height = new_height
+            self._last_move = MOVE_TRANS
+            self._locking_tick_unmoving_lock = self.UNMOVING_TICKS_LOCK
+            self._locking_tick_moving_lock = self.MOVING_TICKS_LOCK
+
+    def lock_tick(self):
+        """
+            lock tick event
+        """
+        if self._is_on_top_of_something():
+            if self._last_dir == 0:
+                self._locking_tick_unmoving_lock -= 1
+            else:
+                self._locking_tick_moving_lock -= 1
+            if self._locking_tick_unmoving_lock <= 0 or self._locking_tick_moving_lock <= 0:
+                self.locked = True
+
+    def step(self, keys: KeyState, time_delta, gravity: bool = False, lock_tick: bool = False) -> List[str]:
+        """
+            Advance the game by one frame
+            :param keys: key state of the frame
+            :param time_delta: time since last frame in milliseconds
+            :param gravity: a gravity tick happened since last frame
+            :param lock_tick: a lock tick happened since last frame
+            :return: events emitted during the frame
+        """
+        self._pending_gravity = self._pending_gravity or gravity
+        self._pending_lock_tick = self._pending_lock_tick or lock_tick
+        if self.locked:
+            self.clear_lines()
+            self.session.set_next_in_queue()
+            self.spawn_piece()
+        else:
+            if self._pending_gravity:
+                self.go_down()
+                self._pending_gravity = False
+            if self._pending_lock_tick:
+                self.lock_tick()
+                self._pending_lock_tick = False
+        self.update(keys, time_delta)
+        return self.pop_events()
@@ -0,0 +1,65 @@
+"""
+    Fixed timestep game logic, independent from the render frame rate
+"""
+from typing import Tuple
+
+# logic ticks per second
+TICK_RATE = 60
+GRAVITY_INTERVAL = 1000
+LOCK_TICK_INTERVAL = 500
+# frame time simulated at most after a slow frame, in milliseconds: longer stalls slow the game down instead
+# of running a burst of ticks
+MAX_FRAME_TIME = 250
+
+
+class GameLoop:
+    """
+        Accumulate render frame times and turn them into fixed length logic ticks.
+        Gravity and lock ticks are counted in simulated time, so slow frames do not change how the game plays.
+    """
+
+    def __init__(self, tick_rate: int = TICK_RATE):
+        self.tick_rate = tick_rate
+        self.tick_time = 1000 / tick_rate
+        self.reset()
+
+    def reset(self):
+        self.ticks = 0
+        # simulated time, in milliseconds
+        self.time = 0.0
+        self._accumulator = 0.0
+        self._next_gravity = GRAVITY_INTERVAL
+        self._next_lock_tick = LOCK_TICK_INTERVAL
+
+    def advance(self, frame_time: float) -> int:
+        """
+        Add the time of a render frame
+        :return: number of logic ticks to run for the frame
+        """
+        self._accumulator += min(frame_time, MAX_FRAME_TIME)
+        ticks = int(self._accumulator // self.tick_time)
+        self._accumulator -= ticks * self.tick_time
+        return ticks
+
+    @property
+    def alpha(self) -> float:
+        """
+        Progress towards the next tick, between 0 and 1, to interpolate rendering between ticks
+        """
+        return self._accumulator / self.tick_time
+
+    def tick(self) -> Tuple[int, bool, bool]:
+        """
+        Advance the simulated time by one tick
+        :return: time delta in whole milliseconds (summing to the simulated time), gravity tick, lock tick
+        """
+        previous = int(self.time)
+        self.ticks += 1
+        self.time = self.ticks * 1000 / self.tick_rate
+        gravity = self.time >= self._next_gravity
+        if gravity:
+            self._next_gravity += GRAVITY_INTERVAL
+        lock_tick = self.time >= self._next_lock_tick
+        if lock_tick:
+            self._next_lock_tick += LOCK_TICK_INTERVAL
+        return int(self.time) - previous, gravity, lock_tick
@@ -5,6 +5,7 @@ from typing import Optional, List, Tuple
 
 import pygame
 
+from pytris.board import Board
 from pytris.cell import Cell
 from pytris.session import GameSession
 
@@ -13,8 +14,8 @@ class Grid(pygame.sprite.Sprite):
     """
         Grid containing the cells and minos
     """
-    HEIGHT = 22
-    WIDTH = 10
+    HEIGHT = Board.HEIGHT
+    WIDTH = Board.WIDTH
 
     def __init__(self, margin_left: int, margin_top: int, session: GameSession):
         super().__init__()
@@ -22,6 +23,14 @@ class Grid(pygame.sprite.Sprite):
         self.margin_left = margin_left
         self.block_size = 25
         self.session = session
+        # locked cells, redrawn only when the board changes
+        self._board_surface: Optional[pygame.Surface] = None
+        self._drawn_board: Optional[Board] = None
+        self._drawn_state = None
+
+    @property
+    def board(self) -> Board:
+        return self.session.board
 
     def get_cell(self, pos: (int, int)) -> Optional[Cell]:
         """
@@ -31,39 +40,20 @@ class Grid(pygame.sprite.Sprite):
         """
         line, col = pos
         if 0 <= line < self.HEIGHT and 0 <= col < self.WIDTH:
-            return Cell(self.session.grid[line][col])
+            return Cell(self.board.get(line, col))
         return None
 
     def set_cell_type(self, cells: List[Tuple[int, int]], new_type: int):
-        for cell in cells:
-            self.session.grid[cell[0]][cell[1]] = new_type
+        self.board.set_cells(cells, new_type)
 
     def get_hd_pos(self, cells_pos: List[Tuple[int, int]]) -> List[Tuple[int, int]]:
         """
             Get hard drop position for given cells. Order is kept
         """
-        okay = True
-        top = 0
-
-        cells_pos_to_return = cells_pos
-        while okay:
-            top += 1
-            new_cells_pos_to_return = []
-            for cell_pos in cells_pos:
-                new_cells_pos_to_return.append((cell_pos[0] + top, cell_pos[1]))
-            new_cells_pos = set(new_cells_pos_to_return).difference(cells_pos)
-
-            conflict = False
-            for new_cell_pos in new_cells_pos:
-                cell = self.get_cell(new_cell_pos)
-                if cell is None or cell.cell_type != Cell.EMPTY:
-                    conflict = True
-                    break
-            if conflict:
-                okay = False
-            else:
-                cells_pos_to_return = new_cells_pos_to_return
-        return cells_pos_to_return
+        distance = self.board.drop_distance(cells_pos)
+        if distance == 0:
+            return cells_pos
+        return [(cell_pos[0] + distance, cell_pos[1]) for cell_pos in cells_pos]
 
     def move(self, left: int, top: int, cells_pos: List[Tuple[int, int]]) -> List[Tuple[int, int]]:
         """
@@ -73,98 +63,64 @@ class Grid(pygame.sprite.Sprite):
         if left == 0 and top == 0:
             return cells_pos
 
-        cells_pos_to_return = cells_pos
+        masks = self.board.to_masks(cells_pos)
+
         correct_top = 0
         if top != 0:
             iteration = top // abs(top)
-            okay = True
-            while okay and abs(correct_top) < abs(top):
+            while abs(correct_top) < abs(top) and self.board.fits_masks(masks, correct_top + iteration):
                 correct_top += iteration
-                new_cells_pos_to_return = []
-                for cell_pos in cells_pos:
-                    new_cells_pos_to_return.append((cell_pos[0] + correct_top, cell_pos[1]))
-                new_cells_pos = set(new_cells_pos_to_return).difference(cells_pos)
-
-                conflict = False
-                for new_cell_pos in new_cells_pos:
-                    cell = self.get_cell(new_cell_pos)
-                    if cell is None or cell.cell_type != Cell.EMPTY:
-                        conflict = True
-                        break
-                if conflict:
-                    okay = False
-                    correct_top -= 1
-                else:
-                    cells_pos_to_return = new_cells_pos_to_return
 
         correct_left = 0
         if left != 0:
             iteration = left // abs(left)
-            okay = True
-            while okay and abs(correct_left) < abs(left):
+            while abs(correct_left) < abs(left) and \
+                    self.board.fits_masks(masks, correct_top, correct_left + iteration):
                 correct_left += iteration
-                new_cells_pos_to_return = []
-                for cell_pos in cells_pos_to_return:
-                    new_cells_pos_to_return.append((cell_pos[0], cell_pos[1] + correct_left))
-                new_cells_pos = set(new_cells_pos_to_return).difference(cells_pos)
-
-                conflict = False
-                for new_cell_pos in new_cells_pos:
-                    cell = self.get_cell(new_cell_pos)
-                    if cell is None or cell.cell_type != Cell.EMPTY:
-                        conflict = True
-                        break
-                if conflict:
-                    okay = False
-                    correct_left -= 1
-                else:
-                    cells_pos_to_return = new_cells_pos_to_return
 
         if correct_top == 0 and correct_left == 0:
             return cells_pos
 
-        return cells_pos_to_return
+        return [(cell_pos[0] + correct_top, cell_pos[1] + correct_left) for cell_pos in cells_pos]
 
     def clear_lines(self) -> int:
         """
             Clear full lines and return the number of cleared lines
         """
-        to_clear = []
-        cleared = []
-        for line in reversed(range(self.HEIGHT)):
-            clear = True
-            for cell in self.session.grid[line]:
-                if cell == Cell.EMPTY:
-                    clear = False
-                    break
-            if clear:
-                to_clear.append(line)
-        for clear_line in to_clear:
-            cleared.append(self.session.grid.pop(clear_line))
-        for line in cleared:
-            for i in range(len(line)):
-                line[i] = Cell.EMPTY
-        self.session.grid = cleared + self.session.grid
-        return len(cleared)
+        return self.board.clear_lines()
 
     def is_board_empty(self) -> bool:
-        for line in self.session.grid:
-            for cell in line:
-                if cell != Cell.EMPTY:
-                    return False
-        return True
+        return self.board.is_empty()
 
-    def draw(self, surface, topped_out: bool):
+    def draw_cell(self, surface, cell_type: int, pos: Tuple[int, int]):
         """
-            Draw the grid and its cells
+            Draw one cell at given grid position
         """
-        gray = Cell(Cell.GARBAGE)
+        surface.blit(Cell.tile(cell_type, self.block_size + 1),
+                     (self.margin_left + pos[1] * self.block_size, self.margin_top + pos[0] * self.block_size))
+
+    def _render_board(self, topped_out: bool):
+        size = self.block_size + 1
+        if self._board_surface is None or self._board_surface.get_width() != self.WIDTH * self.block_size + 1:
+            self._board_surface = pygame.Surface((self.WIDTH * self.block_size + 1, self.HEIGHT * self.block_size + 1))
+            if pygame.display.get_surface() is not None:
+                self._board_surface = self._board_surface.convert()
+        colors = self.board.colors
         for col in range(0, self.WIDTH):
             for line in range(0, self.HEIGHT):
-                rect = pygame.Rect(self.margin_left + col * self.block_size,
-                                   self.margin_top + line * self.block_size,
-                                   self.block_size + 1, self.block_size + 1)
-                if topped_out and self.session.grid[line][col] != Cell.EMPTY:
-                    gray.draw(surface, rect)
-                else:
-                    self.get_cell((line, col)).draw(surface, rect)
+                cell_type = colors[line][col]
+                if topped_out and cell_type != Cell.EMPTY:
+                    cell_type = Cell.GARBAGE
+                self._board_surface.blit(Cell.tile(cell_type, size), (col * self.block_size, line * self.block_size))
+
+    def draw(self, surface, topped_out: bool):
+        """
+            Draw the grid and its cells
+        """
+        board = self.board
+        state = (board.version, topped_out, self.block_size)
+        if board is not self._drawn_board or state != self._drawn_state:
+            self._render_board(topped_out)
+            self._drawn_board = board
+            self._drawn_state = state
+        surface.blit(self._board_surface, (self.margin_left, self.margin_top))
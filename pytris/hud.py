@@ -0,0 +1,139 @@
+"""
+    In-game text labels (stats, score, combo, clear type), drawn without pygame_gui
+"""
+from typing import Dict, List, Optional, Tuple
+
+import pygame
+import pygame.freetype
+import pygame_gui
+
+FONT_NAME = "fira_code"
+FONT_SIZE = 14
+TEXT_COLOR = (0, 0, 0)
+# same layout as the text boxes the HUD replaces
+LINE_HEIGHT = 25
+PADDING = 5
+
+
+class GlyphCache:
+    """
+        Characters of one font, rendered once
+    """
+
+    def __init__(self, font: pygame.freetype.Font, color: Tuple[int, int, int]):
+        self.font = font
+        self.color = color
+        self._glyphs: Dict[str, Tuple[pygame.Surface, int]] = {}
+
+    def glyph(self, char: str) -> Tuple[pygame.Surface, int]:
+        """
+        :return: rendered character and its horizontal advance
+        """
+        glyph = self._glyphs.get(char)
+        if glyph is None:
+            surface, _ = self.font.render(char, self.color)
+            metrics = self.font.get_metrics(char)[0]
+            glyph = self._glyphs[char] = (surface, int(metrics[4]) if metrics else surface.get_width())
+        return glyph
+
+    def width(self, text: str) -> int:
+        return sum(self.glyph(char)[1] for char in text)
+
+    def wrap(self, text: str, width: int) -> List[str]:
+        """
+        Split the text in lines fitting in given width, between words when possible
+        """
+        lines = []
+        line = ""
+        for word in text.split(" "):
+            candidate = f"{line} {word}" if line else word
+            if not line or self.width(candidate) <= width:
+                line = candidate
+            else:
+                lines.append(line)
+                line = word
+        lines.append(line)
+        return lines
+
+    def draw(self, surface: pygame.Surface, text: str, pos: Tuple[int, int]):
+        left, top = pos
+        for char in text:
+            glyph, advance = self.glyph(char)
+            surface.blit(glyph, (left, top))
+            left += advance
+
+
+class HudField:
+    """
+        Text block of the HUD, rendered again only when its text changes
+    """
+
+    def __init__(self, glyphs: GlyphCache, rect: pygame.Rect):
+        self.glyphs = glyphs
+        self.rect = rect
+        self.text: Optional[str] = None
+        self.lines: List[str] = []
+        self._surface: Optional[pygame.Surface] = None
+
+    def set_text(self, text: str):
+        if text == self.text:
+            return
+        self.text = text
+        self._surface = None
+        self.lines = [wrapped for line in text.split("\n") for wrapped in self.glyphs.wrap(line, self.rect.width)]
+        if any(self.lines):
+            self._surface = pygame.Surface((self.rect.width, len(self.lines) * LINE_HEIGHT), pygame.SRCALPHA)
+            for number, line in enumerate(self.lines):
+                self.glyphs.draw(self._surface, line, (0, number * LINE_HEIGHT))
+
+    def draw(self, surface: pygame.Surface):
+        if self._surface is not None:
+            surface.blit(self._surface, self.rect.topleft)
+
+
+class Hud:
+    """
+        In-game labels, drawn from cached glyphs.
+        Fields are text blocks placed like text boxes: padded and wrapped to the box width.
+    """
+
+    def __init__(self, gui_manager: pygame_gui.UIManager):
+        fonts = gui_manager.get_theme().get_font_dictionary()
+        for style, bold in (("regular", False), ("bold", True)):
+            # a Hud is built for every game, pygame_gui warns about fonts preloaded twice
+            if not fonts.check_font_preloaded(fonts.create_font_id(FONT_SIZE, FONT_NAME, bold, False)):
+                gui_manager.preload_fonts([{"name": FONT_NAME, "point_size": FONT_SIZE, "style": style}])
+        self.regular = GlyphCache(fonts.find_font(FONT_SIZE, FONT_NAME), TEXT_COLOR)
+        self.bold = GlyphCache(fonts.find_font(FONT_SIZE, FONT_NAME, bold=True), TEXT_COLOR)
+        self._fields: List[HudField] = []
+
+    def add_field(self, left: int, top: int, width: int, bold: bool = False, text: str = "") -> HudField:
+        field = HudField(self.bold if bold else self.regular, pygame.Rect(left, top, width, LINE_HEIGHT))
+        field.set_text(text)
+        self._fields.append(field)
+        return field
+
+    def add_text_box(self, box: pygame.Rect, text: str = "") -> HudField:
+        """
+        Field placed like a text box: text starts after the padding
+        """
+        return self.add_field(box.left + PADDING, box.top + PADDING, box.width - 2 * PADDING, text=text)
+
+    def add_stats(self, box: pygame.Rect, labels: List[str]) -> List[HudField]:
+        """
+        Bold labels, each one followed by a value line, placed like a text box
+        :return: value fields, in labels order
+        """
+        left = box.left + PADDING
+        top = box.top + PADDING
+        width = box.width - 2 * PADDING
+        values = []
+        for label in labels:
+            top += len(self.add_field(left, top, width, True, label).lines) * LINE_HEIGHT
+            values.append(self.add_field(left, top, width))
+            top += LINE_HEIGHT
+        return values
+
+    def draw(self, surface: pygame.Surface):
+        for field in self._fields:
+            field.draw(surface)
@@ -3,27 +3,13 @@
 """
 import json
 import os.path
-from enum import Enum
-from typing import Dict
+from collections import deque
+from typing import Deque, Dict, Optional, Tuple
 
 import pygame
 from pygame.locals import *
 
-
-class Key(str, Enum):
-    """
-        Relevant keys for the game
-    """
-    HD_KEY = "hard_drop"
-    SD_KEY = "soft_drop"
-    LEFT_KEY = "left"
-    RIGHT_KEY = "right"
-    ROT_CW_KEY = "rotate_cw"
-    ROT_CCW_KEY = "rotate_ccw"
-    ROT_180_KEY = "rotate_180"
-    HOLD_KEY = "hold"
-    RESET_KEY = "reset"
-    EXIT_KEY = "exit"
+from pytris.keys import ALL_KEYS_MASK, KEY_BITS, Key, KeyState
 
 
 class KeyManager:
@@ -31,11 +17,28 @@ class KeyManager:
         Manage key presses and binding
     """
     KEYBIND_FILE_PATH = "data/key_binding.json"
+    DEFAULT_MAPPING = {
+        Key.HD_KEY: K_z,
+        Key.SD_KEY: K_s,
+        Key.LEFT_KEY: K_q,
+        Key.RIGHT_KEY: K_d,
+        Key.ROT_CW_KEY: K_k,
+        Key.ROT_CCW_KEY: K_l,
+        Key.ROT_180_KEY: K_m,
+        Key.HOLD_KEY: K_SPACE,
+        Key.RESET_KEY: K_BACKSPACE,
+        Key.EXIT_KEY: K_ESCAPE,
+        Key.HINT_KEY: K_h
+    }
 
     def __init__(self):
-        self._pressing_keys: Dict[Key, bool] = {}
-        self._just_pressed_keys: Dict[Key, bool] = {}
+        # keys of the last update
+        self.state = KeyState()
         self._enum_to_key_mapping: Dict[Key, int] = {}
+        # key code -> mask of the bound keys
+        self._key_to_bits: Dict[int, int] = {}
+        # (timestamp in milliseconds, keys mask, pressed) of the key events not applied yet, oldest first
+        self._events: Deque[Tuple[int, int, bool]] = deque()
         self._init_mapping()
 
     def _init_mapping(self):
@@ -43,23 +46,18 @@ class KeyManager:
         if os.path.exists(self.KEYBIND_FILE_PATH):
             with open(self.KEYBIND_FILE_PATH, "r") as f:
                 json_data = json.load(f)
+        # keys missing from the saved bindings (added after they were saved) keep their default value
+        self._enum_to_key_mapping = dict(self.DEFAULT_MAPPING)
         if not json_data:
-            self._enum_to_key_mapping = {
-                Key.HD_KEY: K_z,
-                Key.SD_KEY: K_s,
-                Key.LEFT_KEY: K_q,
-                Key.RIGHT_KEY: K_d,
-                Key.ROT_CW_KEY: K_k,
-                Key.ROT_CCW_KEY: K_l,
-                Key.ROT_180_KEY: K_m,
-                Key.HOLD_KEY: K_SPACE,
-                Key.RESET_KEY: K_BACKSPACE,
-                Key.EXIT_KEY: K_ESCAPE
-            }
             print("No binding data was found, setting default values")
-        else:
-            for key, value in json_data.items():
-                self._enum_to_key_mapping[Key(key)] = value
+        for key, value in json_data.items():
+            self._enum_to_key_mapping[Key(key)] = value
+        self._update_key_to_bits()
+
+    def _update_key_to_bits(self):
+        self._key_to_bits = {}
+        for enum, key in self._enum_to_key_mapping.items():
+            self._key_to_bits[key] = self._key_to_bits.get(key, 0) | KEY_BITS[enum]
 
     def key_for(self, enum: Key) -> int:
         """
@@ -78,26 +76,81 @@ class KeyManager:
         with open(self.KEYBIND_FILE_PATH, "w") as f:
             json.dump(bindings, f)
             self._enum_to_key_mapping = dict(bindings)
+        self._update_key_to_bits()
+
+    @staticmethod
+    def _to_dict(mask: int) -> Dict[Key, bool]:
+        return {enum: mask & bit != 0 for enum, bit in KEY_BITS.items()}
 
     @property
     def pressed(self) -> Dict[Key, bool]:
         """
-            Keys that were just pressed this frame
+            Keys that were just pressed this frame. Use state to read keys without building a dict
         """
-        return dict(self._just_pressed_keys)
+        return self._to_dict(self.state.pressed)
 
     @property
     def pressing(self) -> Dict[Key, bool]:
         """
             Keys currently pressed
         """
-        return dict(self._pressing_keys)
+        return self._to_dict(self.state.pressing)
+
+    @property
+    def released(self) -> Dict[Key, bool]:
+        """
+            Keys that were just released this frame
+        """
+        return self._to_dict(self.state.released)
 
-    def update(self):
+    def reset(self):
         """
-            Update pressed keys
+            Drop the queued key events and start from the keys currently held
         """
+        self._events.clear()
         pressed_keys = pygame.key.get_pressed()
+        pressing = 0
         for enum, key in self._enum_to_key_mapping.items():
-            self._just_pressed_keys[enum] = pressed_keys[key] and not self._pressing_keys[enum]
-            self._pressing_keys[enum] = pressed_keys[self._enum_to_key_mapping[enum]]
+            if pressed_keys[key]:
+                pressing |= KEY_BITS[enum]
+        self.state = KeyState(pressing=pressing)
+
+    def process_event(self, event):
+        """
+            Queue the key events of bound keys, applied by update
+        """
+        if event.type in (KEYDOWN, KEYUP):
+            bits = self._key_to_bits.get(event.key)
+            if bits:
+                # SDL timestamp when the event has one, else the time it is processed
+                timestamp = getattr(event, "timestamp", None)
+                if timestamp is None:
+                    timestamp = pygame.time.get_ticks()
+                self._events.append((timestamp, bits, event.type == KEYDOWN))
+        elif event.type == WINDOWFOCUSLOST:
+            # key releases are not received while the window is not focused
+            self._events.append((pygame.time.get_ticks(), ALL_KEYS_MASK, False))
+
+    def update(self, until: Optional[float] = None):
+        """
+            Apply the key events queued up to given time
+            :param until: time in milliseconds, all queued events if None
+        """
+        events = self._events
+        state = self.state
+        if not events and not state.pressed and not state.released:
+            # nothing changed, keep the same snapshot
+            return
+        pressing = state.pressing
+        pressed = 0
+        released = 0
+        while events and (until is None or events[0][0] <= until):
+            _, bits, down = events.popleft()
+            if down:
+                # a key pressed and released before the update is still just pressed
+                pressed |= bits & ~pressing
+                pressing |= bits
+            else:
+                released |= bits & pressing
+                pressing &= ~bits
+        self.state = KeyState(pressed, pressing, released)
@@ -0,0 +1,48 @@
+"""
+    Relevant keys for the game, independent from pygame key codes
+"""
+from enum import Enum
+from typing import Dict, NamedTuple
+
+
+class Key(str, Enum):
+    """
+        Relevant keys for the game
+    """
+    HD_KEY = "hard_drop"
+    SD_KEY = "soft_drop"
+    LEFT_KEY = "left"
+    RIGHT_KEY = "right"
+    ROT_CW_KEY = "rotate_cw"
+    ROT_CCW_KEY = "rotate_ccw"
+    ROT_180_KEY = "rotate_180"
+    HOLD_KEY = "hold"
+    RESET_KEY = "reset"
+    EXIT_KEY = "exit"
+    HINT_KEY = "hint"
+
+
+# bit of each key in key masks, by declaration order
+KEY_BITS: Dict[Key, int] = {key: 1 << ordinal for ordinal, key in enumerate(Key)}
+ALL_KEYS_MASK = (1 << len(KEY_BITS)) - 1
+
+
+class KeyState(NamedTuple):
+    """
+        Immutable snapshot of the keys for one frame, as masks of KEY_BITS
+    """
+    # keys just pressed this frame
+    pressed: int = 0
+    # keys currently pressed
+    pressing: int = 0
+    # keys just released this frame
+    released: int = 0
+
+    def is_pressed(self, key: Key) -> bool:
+        return self.pressed & KEY_BITS[key] != 0
+
+    def is_pressing(self, key: Key) -> bool:
+        return self.pressing & KEY_BITS[key] != 0
+
+    def is_released(self, key: Key) -> bool:
+        return self.released & KEY_BITS[key] != 0
@@ -0,0 +1,303 @@
+"""
+Move generator: find every final placement reachable by a piece, following SRS rotation and kick rules.
+"""
+from collections import deque
+from functools import lru_cache
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from pytris.board import Board
+from pytris.engine import GameState, MOVE_KICK, MOVE_ROT, MOVE_TRANS, MOVE_TST_KICK, is_tspin, is_tspin_mini
+from pytris.pieces import *
+from pytris.piecetables import KICK_OFFSETS, PIECE_MASKS, fits, piece_cells, try_rotate
+
+INPUT_HOLD = "hold"
+INPUT_LEFT = "left"
+INPUT_RIGHT = "right"
+# move sideways until something is in the way (charged DAS with instant ARR)
+INPUT_DAS_LEFT = "das_left"
+INPUT_DAS_RIGHT = "das_right"
+# go down one line
+INPUT_DOWN = "down"
+# go down until something is in the way (instant soft drop)
+INPUT_SOFT_DROP = "soft_drop"
+INPUT_ROT_CW = "rotate_cw"
+INPUT_ROT_CCW = "rotate_ccw"
+INPUT_ROT_180 = "rotate_180"
+INPUT_HARD_DROP = "hard_drop"
+
+_ROTATIONS = ((INPUT_ROT_CW, 1), (INPUT_ROT_CCW, -1), (INPUT_ROT_180, 2))
+
+CACHE_SIZE = 4096
+
+# Origin positions packed in one integer for find_landings: bit (line + 2) * _STRIDE + col + 2.
+# Origins go from line -2 and column -2, the 4 highest bits of each line are never valid origins.
+_STRIDE = 16
+_ORIGIN_LINE_MASK = (1 << (Board.WIDTH + 2)) - 1
+_ORIGIN_MASK = sum(_ORIGIN_LINE_MASK << (line * _STRIDE) for line in range(Board.HEIGHT + 4))
+
+
+class Placement(NamedTuple):
+    """
+        Final resting position of a piece
+    """
+    piece: int
+    rotation: int
+    # origin of the piece (see pytris.piecetables)
+    line: int
+    col: int
+    cells: Tuple[Tuple[int, int], ...]
+    # shortest input sequence reaching the placement, ending with a hard drop
+    inputs: Tuple[str, ...]
+    hold: bool
+    tspin: bool
+    mini: bool
+    lines_cleared: int
+
+
+# search state: (rotation, line, col, last move)
+_State = Tuple[int, int, int, Optional[str]]
+
+
+def _slide(board: Board, piece: int, rotation: int, line: int, col: int, d_line: int, d_col: int) -> Tuple[int, int]:
+    while fits(board, piece, rotation, line + d_line, col + d_col):
+        line += d_line
+        col += d_col
+    return line, col
+
+
+def _next_states(board: Board, piece: int, state: _State):
+    rotation, line, col, last_move = state
+    # only T-spins depend on the last move
+    trans = MOVE_TRANS if piece == T_PIECE else None
+
+    for name, d_col in ((INPUT_LEFT, -1), (INPUT_RIGHT, 1)):
+        if fits(board, piece, rotation, line, col + d_col):
+            yield name, (rotation, line, col + d_col, trans)
+    for name, d_col in ((INPUT_DAS_LEFT, -1), (INPUT_DAS_RIGHT, 1)):
+        _, new_col = _slide(board, piece, rotation, line, col, 0, d_col)
+        if new_col - col not in (0, d_col):
+            yield name, (rotation, line, new_col, trans)
+    if fits(board, piece, rotation, line + 1, col):
+        yield INPUT_DOWN, (rotation, line + 1, col, trans)
+        new_line, _ = _slide(board, piece, rotation, line, col, 1, 0)
+        if new_line != line + 1:
+            yield INPUT_SOFT_DROP, (rotation, new_line, col, trans)
+
+    if piece == O_PIECE:
+        return
+    for name, rotation_delta in _ROTATIONS:
+        new_rotation = (rotation + rotation_delta) % 4
+        kick = try_rotate(board, piece, rotation, new_rotation, line, col)
+        if kick is None:
+            continue
+        mode, new_line, new_col = kick
+        move = None
+        if piece == T_PIECE:
+            # same rules as GameState._rotate
+            if mode == 0:
+                move = MOVE_ROT
+            elif rotation in (0, 2) and mode == 4:
+                move = MOVE_TST_KICK
+            else:
+                move = MOVE_KICK
+        yield name, (new_rotation, new_line, new_col, move)
+
+
+def _lines_cleared(board: Board, piece: int, rotation: int, line: int, col: int) -> int:
+    cleared = 0
+    for y, mask in PIECE_MASKS[piece][rotation][col]:
+        if board.rows[line + y] | mask == Board.FULL_LINE:
+            cleared += 1
+    return cleared
+
+
+def _search(board: Board, piece: int, hold: bool) -> List[Placement]:
+    spawn_line, spawn_col = GameState.SPAWN_POS[piece]
+    if not fits(board, piece, 0, spawn_line, spawn_col):
+        return []
+    start: _State = (0, spawn_line, spawn_col, None)
+    parents = {start: None}
+    # landing state -> first (so closest) state dropping there
+    landings = {}
+    # (rotation, line, col) -> landing line
+    landing_lines = {}
+    queue = deque([start])
+    while queue:
+        state = queue.popleft()
+        rotation, line, col, last_move = state
+        position = (rotation, line, col)
+        landing_line = landing_lines.get(position)
+        if landing_line is None:
+            landing_line, _ = _slide(board, piece, rotation, line, col, 1, 0)
+            landing_lines[position] = landing_line
+        landing = (rotation, landing_line, col, last_move)
+        if landing not in landings:
+            landings[landing] = state
+
+        for name, next_state in _next_states(board, piece, state):
+            if next_state not in parents:
+                parents[next_state] = (state, name)
+                queue.append(next_state)
+
+    found = {}
+    for (rotation, line, col, last_move), state in landings.items():
+        cells = piece_cells(piece, rotation, line, col)
+        tspin = is_tspin(board, piece, rotation, cells, last_move)
+        mini = False if tspin else is_tspin_mini(board, piece, cells, last_move)
+        key = (frozenset(cells), tspin, mini)
+        if key in found:
+            continue
+        inputs = [INPUT_HARD_DROP]
+        while parents[state] is not None:
+            state, name = parents[state]
+            inputs.append(name)
+        if hold:
+            inputs.append(INPUT_HOLD)
+        found[key] = Placement(piece, rotation, line, col, tuple(cells), tuple(reversed(inputs)), hold,
+                               tspin, mini, _lines_cleared(board, piece, rotation, line, col))
+    return list(found.values())
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def _cached_placements(rows: Tuple[int, ...], piece: int, hold_piece: Optional[int]) -> Tuple[Placement, ...]:
+    # only the line bitmasks are used by the search
+    board = Board.from_rows(rows)
+    placements = _search(board, piece, False)
+    if hold_piece is not None and hold_piece != piece:
+        placements += _search(board, hold_piece, True)
+    return tuple(placements)
+
+
+def find_placements(board: Board, piece: int, hold_piece: Optional[int] = None) -> List[Placement]:
+    """
+    Find every distinct final resting placement of the piece, and of the hold piece if given.
+    Placements are distinct by their cells and T-spin type, each one given with its shortest input sequence.
+
+    Results are cached by board and pieces.
+    :param board: board without the active piece
+    :param piece: current piece
+    :param hold_piece: hold piece, None if the hold is empty or not allowed
+    """
+    return list(_cached_placements(tuple(board.rows), piece, hold_piece))
+
+
+def _position_bit(line: int, col: int) -> int:
+    return (line + 2) * _STRIDE + col + 2
+
+
+def _shift(positions: int, shift: int) -> int:
+    return positions << shift if shift >= 0 else positions >> -shift
+
+
+def _build_duplicates() -> Dict[int, List[Tuple[int, int, int]]]:
+    """
+    :return: for each piece, (rotation, earlier rotation, packed shift) of rotations with the same minos as an earlier one
+    """
+    duplicates = {}
+    for piece, rotations in PIECES_ROT.items():
+        packed = [sorted(y * _STRIDE + x for y, x in minos) for minos in rotations]
+        duplicates[piece] = []
+        for rotation, offsets in enumerate(packed):
+            for base in range(rotation):
+                shift = offsets[0] - packed[base][0]
+                if [offset - shift for offset in offsets] == packed[base]:
+                    duplicates[piece].append((rotation, base, shift))
+                    break
+    return duplicates
+
+
+# same landing cells reached with 2 rotations (I, S and Z pieces)
+_DUPLICATES = _build_duplicates()
+
+
+def _fill(positions: int, fitting: int, shift: int, steps: int) -> int:
+    """
+    Extend the positions by repeating a move while the piece fits, for up to 2 ** steps - 1 moves
+    (shift > 0 for right and down moves, < 0 for left moves)
+    """
+    if shift > 0:
+        for _ in range(steps):
+            positions |= (positions << shift) & fitting
+            fitting &= fitting << shift
+            shift *= 2
+    else:
+        shift = -shift
+        for _ in range(steps):
+            positions |= (positions >> shift) & fitting
+            fitting &= fitting >> shift
+            shift *= 2
+    return positions
+
+
+def _fitting_origins(board: Board, piece: int) -> List[int]:
+    """
+    :return: for each rotation, packed origins where the piece fits in the board
+    """
+    empty = 0
+    for line, row in enumerate(board.rows):
+        empty |= (~row & Board.FULL_LINE) << _position_bit(line, 0)
+    origins = []
+    for minos in PIECES_ROT[piece]:
+        fitting = _ORIGIN_MASK
+        for y, x in minos:
+            fitting &= _shift(empty, -(y * _STRIDE + x))
+        origins.append(fitting)
+    return origins
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def _cached_landings(rows: Tuple[int, ...], piece: int) -> Tuple[Tuple[int, int, int], ...]:
+    board = Board.from_rows(rows)
+    fitting = _fitting_origins(board, piece)
+    reachable = [0] * len(fitting)
+    spawn_line, spawn_col = GameState.SPAWN_POS[piece]
+    reachable[0] = fitting[0] & (1 << _position_bit(spawn_line, spawn_col))
+    col_steps = (Board.WIDTH + 2).bit_length()
+    line_steps = (Board.HEIGHT + 3).bit_length()
+
+    changed = bool(reachable[0])
+    while changed:
+        changed = False
+        for rotation, positions in enumerate(reachable):
+            # moves left, right and down
+            moved = _fill(positions, fitting[rotation], 1, col_steps)
+            moved = _fill(moved, fitting[rotation], -1, col_steps)
+            moved = _fill(moved, fitting[rotation], _STRIDE, line_steps)
+            if moved != positions:
+                reachable[rotation] = moved
+                changed = True
+        for rotation, kicks in enumerate(KICK_OFFSETS[piece]):
+            for new_rotation, offsets in kicks.items():
+                # positions still trying the next kick
+                remaining = reachable[rotation]
+                for d_line, d_col in offsets:
+                    shift = d_line * _STRIDE + d_col
+                    kicked = _shift(remaining, shift) & fitting[new_rotation]
+                    remaining &= ~_shift(fitting[new_rotation], -shift)
+                    if kicked & ~reachable[new_rotation]:
+                        reachable[new_rotation] |= kicked
+                        changed = True
+
+    # reachable positions which cannot go down
+    landings = [positions & ~(fitting[rotation] >> _STRIDE) for rotation, positions in enumerate(reachable)]
+    for rotation, base, shift in _DUPLICATES[piece]:
+        landings[rotation] &= ~_shift(landings[base], -shift)
+    result = []
+    for rotation, positions in enumerate(landings):
+        while positions:
+            bit = positions & -positions
+            positions ^= bit
+            line, col = divmod(bit.bit_length() - 1, _STRIDE)
+            result.append((rotation, line - 2, col - 2))
+    return tuple(result)
+
+
+def find_landings(board: Board, piece: int) -> List[Tuple[int, int, int]]:
+    """
+    Find every distinct final resting position of the piece, as (rotation, line, col) origins.
+    Much faster than find_placements for searches only needing the cells: no inputs and no T-spin detection.
+
+    Results are cached by board and piece.
+    """
+    return list(_cached_landings(tuple(board.rows), piece))
+
@@ -0,0 +1,260 @@
+"""
+Perfect clear solver.
+
+Depth-first search over the landing positions given by the move generator, pruned with a transposition table,
+with the root branches spread across worker processes.
+"""
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import List, NamedTuple, Optional, Sequence, Set, Tuple
+
+from pytris.board import Board
+from pytris.movegen import Placement, find_landings, find_placements
+from pytris.pieces import PIECES_ROT, T_PIECE
+from pytris.piecetables import PIECE_MASKS, piece_cells
+
+# highest perfect clear searched, in lines
+MAX_PC_HEIGHT = 4
+
+# _TOP_OFFSET[piece][rotation] -> line offset of the highest mino
+_TOP_OFFSET = {piece: [min(y for y, _ in minos) for minos in rotations] for piece, rotations in PIECES_ROT.items()}
+
+
+class _Step(NamedTuple):
+    piece: int
+    rotation: int
+    line: int
+    col: int
+    hold: bool
+
+
+class _Timeout(Exception):
+    pass
+
+
+def _place(rows: Tuple[int, ...], step: _Step) -> Tuple[Tuple[int, ...], int]:
+    """
+    :return: line bitmasks after locking the piece and clearing lines, number of cleared lines
+    """
+    new_rows = list(rows)
+    for y, mask in PIECE_MASKS[step.piece][step.rotation][step.col]:
+        new_rows[step.line + y] |= mask
+    kept = [row for row in new_rows if row != Board.FULL_LINE]
+    cleared = Board.HEIGHT - len(kept)
+    return tuple([0] * cleared + kept), cleared
+
+
+def _advance(queue: Sequence[int], index: int, hold: Optional[int], step: _Step) -> Tuple[int, Optional[int]]:
+    """
+    :return: queue index of the next current piece and new hold piece after the step
+    """
+    if not step.hold:
+        return index + 1, hold
+    if hold is None:
+        # holding with an empty hold also takes the next piece
+        return index + 2, queue[index]
+    return index + 1, queue[index]
+
+
+def _pieces_left(queue: Sequence[int], index: int, hold: Optional[int]) -> List[int]:
+    """
+    :return: pieces not played yet
+    """
+    return list(queue[index:]) + ([] if hold is None else [hold])
+
+
+# empty cells of an area are packed in one integer, with an unused column between lines
+_AREA_STRIDE = Board.WIDTH + 1
+# the stride is odd: bit parity is the checkerboard color of the cell
+_EVEN_CELLS = int("01" * (_AREA_STRIDE * MAX_PC_HEIGHT), 2)
+
+
+def _feasible(rows: Tuple[int, ...], height: int, pieces: List[int]) -> bool:
+    """
+    Cheap necessary conditions for a perfect clear in the bottom height lines:
+    - enough pieces
+    - each connected empty area has a number of cells multiple of 4
+    - enough T pieces to fill the empty cells: other pieces cover as many cells of each checkerboard color
+    """
+    empty = 0
+    for row in rows[Board.HEIGHT - height:]:
+        empty = empty << _AREA_STRIDE | (~row & Board.FULL_LINE)
+    if bin(empty).count("1") > 4 * len(pieces):
+        return False
+    imbalance = bin(empty & _EVEN_CELLS).count("1") - bin(empty & ~_EVEN_CELLS).count("1")
+    if abs(imbalance) > 2 * pieces.count(T_PIECE):
+        return False
+    while empty:
+        area = empty & -empty
+        while True:
+            grown = (area | area << 1 | area >> 1 | area << _AREA_STRIDE | area >> _AREA_STRIDE) & empty
+            if grown == area:
+                break
+            area = grown
+        if bin(area).count("1") % 4:
+            return False
+        empty ^= area
+    return True
+
+
+def _swap_piece(queue: Sequence[int], index: int, hold: Optional[int], hold_allowed: bool) -> Optional[int]:
+    """
+    :return: piece played when holding, None if holding is not possible
+    """
+    if not hold_allowed:
+        return None
+    if hold is not None:
+        return hold
+    return queue[index + 1] if index + 1 < len(queue) else None
+
+
+def _candidates(rows: Tuple[int, ...], queue: Sequence[int], index: int, hold: Optional[int],
+                height: int, hold_allowed: bool) -> List[_Step]:
+    if index >= len(queue):
+        return []
+    board = Board.from_rows(rows)
+    top = Board.HEIGHT - height
+    steps = []
+    pieces = [(queue[index], False)]
+    swap = _swap_piece(queue, index, hold, hold_allowed)
+    if swap is not None and swap != queue[index]:
+        pieces.append((swap, True))
+    for piece, held in pieces:
+        top_offset = _TOP_OFFSET[piece]
+        for rotation, line, col in find_landings(board, piece):
+            if line + top_offset[rotation] >= top:
+                steps.append(_Step(piece, rotation, line, col, held))
+    # lowest steps first, they are the most likely to lead to a perfect clear
+    steps.sort(key=lambda step: -step.line)
+    return steps
+
+
+def _search(rows: Tuple[int, ...], queue: Tuple[int, ...], index: int, hold: Optional[int], height: int,
+            hold_allowed: bool, failed: Set, deadline: float) -> Optional[List[_Step]]:
+    if time.time() > deadline:
+        raise _Timeout()
+    # Zobrist hash of the lines: small table keys, collisions are negligible with 64 bits
+    key = (Board.hash_rows(rows), index, hold, height)
+    if key in failed:
+        return None
+    for step in _candidates(rows, queue, index, hold, height, hold_allowed):
+        new_rows, cleared = _place(rows, step)
+        if not any(new_rows):
+            return [step]
+        new_height = height - cleared
+        new_index, new_hold = _advance(queue, index, hold, step)
+        if not _feasible(new_rows, new_height, _pieces_left(queue, new_index, new_hold)):
+            continue
+        solution = _search(new_rows, queue, new_index, new_hold, new_height, True, failed, deadline)
+        if solution is not None:
+            return [step] + solution
+    failed.add(key)
+    return None
+
+
+def _solve_branch(rows: Tuple[int, ...], queue: Tuple[int, ...], hold: Optional[int], height: int,
+                  step: _Step, deadline: float) -> Optional[List[_Step]]:
+    """
+    Search the perfect clears starting with given step (worker process entry point)
+    """
+    new_rows, cleared = _place(rows, step)
+    if not any(new_rows):
+        return [step]
+    new_index, new_hold = _advance(queue, 0, hold, step)
+    if not _feasible(new_rows, height - cleared, _pieces_left(queue, new_index, new_hold)):
+        return None
+    try:
+        solution = _search(new_rows, queue, new_index, new_hold, height - cleared, True, set(), deadline)
+    except _Timeout:
+        return None
+    return None if solution is None else [step] + solution
+
+
+def pc_heights(board: Board, pieces: int) -> List[int]:
+    """
+    :return: perfect clear heights reachable with given number of pieces, lowest first
+    """
+    used_lines = Board.HEIGHT - next((line for line, row in enumerate(board.rows) if row), Board.HEIGHT)
+    filled = sum(bin(row).count("1") for row in board.rows)
+    heights = []
+    for height in range(max(1, used_lines), MAX_PC_HEIGHT + 1):
+        empty = Board.WIDTH * height - filled
+        if empty > 0 and empty % 4 == 0 and empty // 4 <= pieces:
+            heights.append(height)
+    return heights
+
+
+def solve(board: Board, queue: Sequence[int], hold_piece: Optional[int] = None, hold_allowed: bool = True,
+          time_budget: float = 1.0, workers: Optional[int] = None) -> Optional[List[Placement]]:
+    """
+    Find a perfect clear using the given pieces
+    :param board: board without the active piece
+    :param queue: current piece followed by the visible queue
+    :param hold_piece: hold piece, None if the hold is empty
+    :param hold_allowed: if the current piece can be held
+    :param time_budget: maximum search time in seconds
+    :param workers: number of worker processes for the root branches (cpu count if not given, 1 to stay in process)
+    :return: placements to do in order (placement.hold means hold before moving), None if no solution was found
+    """
+    deadline = time.time() + time_budget
+    queue = tuple(queue)
+    rows = tuple(board.rows)
+    workers = (os.cpu_count() or 1) if workers is None else workers
+
+    for height in pc_heights(board, len(_pieces_left(queue, 0, hold_piece))):
+        if not _feasible(rows, height, _pieces_left(queue, 0, hold_piece)):
+            continue
+        if workers <= 1:
+            try:
+                solution = _search(rows, queue, 0, hold_piece, height, hold_allowed, set(), deadline)
+            except _Timeout:
+                return None
+        else:
+            solution = _solve_parallel(rows, queue, hold_piece, height, hold_allowed, deadline, workers)
+        if solution is not None:
+            return _to_placements(rows, queue, hold_piece, hold_allowed, solution)
+        if time.time() > deadline:
+            return None
+    return None
+
+
+def _solve_parallel(rows: Tuple[int, ...], queue: Tuple[int, ...], hold: Optional[int], height: int,
+                    hold_allowed: bool, deadline: float, workers: int) -> Optional[List[_Step]]:
+    roots = _candidates(rows, queue, 0, hold, height, hold_allowed)
+    if not roots:
+        return None
+    executor = ProcessPoolExecutor(max_workers=min(workers, len(roots)))
+    try:
+        pending = {executor.submit(_solve_branch, rows, queue, hold, height, step, deadline) for step in roots}
+        while pending:
+            done, pending = wait(pending, timeout=max(0.0, deadline - time.time()), return_when=FIRST_COMPLETED)
+            if not done:
+                return None
+            for future in done:
+                solution = future.result()
+                if solution is not None:
+                    return solution
+        return None
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _to_placements(rows: Tuple[int, ...], queue: Tuple[int, ...], hold: Optional[int], hold_allowed: bool,
+                   steps: List[_Step]) -> List[Placement]:
+    """
+    Replay the steps with the move generator, to get their input sequences
+    """
+    placements = []
+    index = 0
+    for step in steps:
+        board = Board.from_rows(rows)
+        cells = set(piece_cells(step.piece, step.rotation, step.line, step.col))
+        swap = _swap_piece(queue, index, hold, hold_allowed)
+        placements.append(next(placement for placement in find_placements(board, queue[index], swap)
+                               if placement.hold == step.hold and set(placement.cells) == cells))
+        rows, _ = _place(rows, step)
+        index, hold = _advance(queue, index, hold, step)
+        hold_allowed = True
+    return placements
+
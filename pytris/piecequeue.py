@@ -0,0 +1,68 @@
+"""
+    Upcoming pieces of a game, dealt from a seekable bag randomizer
+"""
+from collections import deque
+from itertools import chain, islice
+from typing import Deque, Iterator, Optional, Tuple
+
+from pytris.randomizer import BAG_SIZE, BagRandomizer
+
+# pieces shown in the preview
+PREVIEW_SIZE = 5
+
+
+class PieceQueue:
+    """
+        Pieces dealt next, in a deque holding at least the preview window.
+        Bags are appended when needed, and the preview is only updated when a piece is taken.
+    """
+
+    def __init__(self):
+        self.randomizer: Optional[BagRandomizer] = None
+        # index of the next piece in the piece sequence
+        self.index = 0
+        self._pieces: Deque[int] = deque()
+        # index of the next bag to append
+        self._next_bag = 0
+        self.preview: Tuple[int, ...] = ()
+
+    def reset(self, randomizer: BagRandomizer, index: int = 0):
+        """
+        Deal pieces of given randomizer, starting at given piece index
+        """
+        self.randomizer = randomizer
+        self.index = index
+        bag, offset = divmod(index, BAG_SIZE)
+        self._pieces.clear()
+        self._pieces.extend(islice(randomizer.bag(bag), offset, None))
+        self._next_bag = bag + 1
+        self._fill()
+        self._update_preview()
+
+    def _fill(self):
+        while len(self._pieces) <= PREVIEW_SIZE:
+            self._pieces.extend(self.randomizer.bag(self._next_bag))
+            self._next_bag += 1
+
+    def _update_preview(self):
+        self.preview = tuple(islice(self._pieces, PREVIEW_SIZE))
+
+    def pop(self) -> int:
+        """
+        :return: next piece, removed from the queue
+        """
+        piece = self._pieces.popleft()
+        self.index += 1
+        self._fill()
+        self._update_preview()
+        return piece
+
+    def lookahead(self) -> Iterator[int]:
+        """
+        :return: endless read-only iterator of the pieces dealt next, in order, for analysis tools.
+        Taking pieces from the queue while iterating is not supported
+        """
+        return chain(iter(self._pieces), self.randomizer.pieces(self._next_bag * BAG_SIZE))
+
+    def __len__(self):
+        return len(self._pieces)
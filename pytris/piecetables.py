@@ -0,0 +1,92 @@
+"""
+Tables precomputed at startup from PIECES_ROT and the wall kick tables.
+
+A piece position is given by its origin (line, col): the piece minos are at
+(line + y, col + x) for each (y, x) of PIECES_ROT[piece][rotation].
+"""
+from typing import Dict, List, Optional, Tuple
+
+from pytris.board import Board
+from pytris.pieces import *
+
+# PIECE_MASKS[piece][rotation][col] -> ((line offset, line bitmask), ...) for a piece with its origin at column col.
+# Only origin columns keeping the whole piece inside the board are present.
+PIECE_MASKS: Dict[int, List[Dict[int, Tuple[Tuple[int, int], ...]]]] = {}
+
+# KICK_OFFSETS[piece][from rotation][to rotation] -> ((line offset, col offset), ...) to apply to the origin,
+# in the order they must be tested
+KICK_OFFSETS: Dict[int, List[Dict[int, Tuple[Tuple[int, int], ...]]]] = {}
+
+
+def _build_piece_masks(base: List[Tuple[int, int]]) -> Dict[int, Tuple[Tuple[int, int], ...]]:
+    masks = {}
+    min_x = min(x for _, x in base)
+    max_x = max(x for _, x in base)
+    for col in range(-min_x, Board.WIDTH - max_x):
+        lines = {}
+        for y, x in base:
+            lines[y] = lines.get(y, 0) | (1 << (col + x))
+        masks[col] = tuple(sorted(lines.items()))
+    return masks
+
+
+def _build_tables():
+    for piece, rotations in PIECES_ROT.items():
+        PIECE_MASKS[piece] = [_build_piece_masks(base) for base in rotations]
+        if piece == O_PIECE:
+            KICK_OFFSETS[piece] = [{}]
+            continue
+        # kick tables coordinates are (Y, -X)
+        kick_table = I_WALL_KICKS if piece == I_PIECE else WALL_KICKS
+        KICK_OFFSETS[piece] = [
+            {to_rot: tuple((-kick[1], kick[0]) for kick in kicks) for to_rot, kicks in from_kicks.items()}
+            for from_kicks in kick_table
+        ]
+
+
+_build_tables()
+
+
+def piece_cells(piece: int, rotation: int, line: int, col: int) -> List[Tuple[int, int]]:
+    """
+    :return: minos positions of the piece at given origin, in PIECES_ROT order
+    """
+    return [(line + y, col + x) for y, x in PIECES_ROT[piece][rotation]]
+
+
+def piece_origin(piece: int, rotation: int, cells: List[Tuple[int, int]]) -> Tuple[int, int]:
+    """
+    :return: origin of the piece whose minos are at given positions (in PIECES_ROT order)
+    """
+    y, x = PIECES_ROT[piece][rotation][0]
+    return cells[0][0] - y, cells[0][1] - x
+
+
+def fits(board: Board, piece: int, rotation: int, line: int, col: int) -> bool:
+    """
+    Test if the piece at given origin is inside the board and does not collide with used cells
+    """
+    masks = PIECE_MASKS[piece][rotation].get(col)
+    if masks is None:
+        return False
+    rows = board.rows
+    for y, mask in masks:
+        y += line
+        if not 0 <= y < Board.HEIGHT or rows[y] & mask:
+            return False
+    return True
+
+
+def try_rotate(board: Board, piece: int, rotation: int, new_rotation: int,
+               line: int, col: int) -> Optional[Tuple[int, int, int]]:
+    """
+    Try to rotate the piece following SRS kick rules
+    :return: (kick index, new origin line, new origin col) of the first valid kick, None if no kick is valid
+    """
+    kicks = KICK_OFFSETS[piece][rotation].get(new_rotation)
+    if kicks is None:
+        return None
+    for index, (d_line, d_col) in enumerate(kicks):
+        if fits(board, piece, new_rotation, line + d_line, col + d_col):
+            return index, line + d_line, col + d_col
+    return None
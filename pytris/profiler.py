@@ -0,0 +1,111 @@
+"""
+Frame phase timing, exported as a Chrome trace (chrome://tracing or https://ui.perfetto.dev).
+
+Enabled by setting the PYTRIS_PROFILE environment variable. Phases are recorded in a preallocated ring buffer
+keeping the latest events, dumped to the profiles directory on exit or when pressing the dump key.
+When disabled, timing a phase costs one attribute check.
+"""
+import atexit
+import json
+import os
+import time
+from array import array
+from typing import Dict, List, Optional, Tuple
+
+import pygame
+
+PROFILE_ENV = "PYTRIS_PROFILE"
+PROFILE_DIR = "profiles"
+# events kept in the ring buffer
+CAPACITY = 1 << 16
+DUMP_KEY = pygame.K_F12
+
+
+class Profiler:
+    """
+        Ring buffer of timed phases
+    """
+
+    def __init__(self, enabled: bool, capacity: int = CAPACITY):
+        self.enabled = enabled
+        self.capacity = capacity if enabled else 0
+        # (category, name) of each phase id
+        self._phases: List[Tuple[str, str]] = []
+        self._phase_ids: Dict[Tuple[str, str], int] = {}
+        self._ids = array("H", [0]) * self.capacity
+        self._starts = array("d", [0.0]) * self.capacity
+        self._durations = array("d", [0.0]) * self.capacity
+        # total number of recorded events, the buffer index is count % capacity
+        self._count = 0
+        self._origin = time.perf_counter()
+
+    def begin(self) -> float:
+        """
+        :return: start time of a phase, to give to end
+        """
+        if not self.enabled:
+            return 0.0
+        return time.perf_counter()
+
+    def end(self, name: str, start: float, category: str = "game"):
+        """
+        Record a phase started with begin
+        """
+        if not self.enabled:
+            return
+        duration = time.perf_counter() - start
+        key = (category, name)
+        phase = self._phase_ids.get(key)
+        if phase is None:
+            phase = self._phase_ids[key] = len(self._phases)
+            self._phases.append(key)
+        index = self._count % self.capacity
+        self._ids[index] = phase
+        self._starts[index] = start
+        self._durations[index] = duration
+        self._count += 1
+
+    def process_event(self, event):
+        if self.enabled and event.type == pygame.KEYDOWN and event.key == DUMP_KEY:
+            print(f"trace saved to {self.dump()}")
+
+    def trace_events(self) -> List[dict]:
+        """
+        :return: recorded phases as Chrome trace complete events, oldest first
+        """
+        events = []
+        pid = os.getpid()
+        first = max(0, self._count - self.capacity)
+        for number in range(first, self._count):
+            index = number % self.capacity
+            category, name = self._phases[self._ids[index]]
+            events.append({
+                "name": name,
+                "cat": category,
+                "ph": "X",
+                # microseconds
+                "ts": (self._starts[index] - self._origin) * 1e6,
+                "dur": self._durations[index] * 1e6,
+                "pid": pid,
+                "tid": 0
+            })
+        return events
+
+    def dump(self, path: Optional[str] = None) -> Optional[str]:
+        """
+        Write the recorded phases to a Chrome trace file
+        :return: file path, None if disabled
+        """
+        if not self.enabled:
+            return None
+        if path is None:
+            os.makedirs(PROFILE_DIR, exist_ok=True)
+            path = os.path.join(PROFILE_DIR, f"trace-{time.strftime('%Y%m%d-%H%M%S')}.json")
+        with open(path, "w") as f:
+            json.dump({"traceEvents": self.trace_events(), "displayTimeUnit": "ms"}, f)
+        return path
+
+
+profiler = Profiler(os.environ.get(PROFILE_ENV, "0") not in ("", "0"))
+if profiler.enabled:
+    atexit.register(profiler.dump)
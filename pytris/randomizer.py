@@ -0,0 +1,92 @@
+"""
+7-bag piece randomizers, seekable to any piece index.
+
+Version 1 (current): bag k of a seed is derived directly from (seed, k), so any bag is computed in constant time
+and the piece sequence does not depend on the Python version:
+- digest = BLAKE2b, 64 bytes, personalization b"pytris 7-bag v1", of the seed UTF-8 bytes followed by k as
+  8 bytes little endian
+- bag = [0, 1, 2, 3, 4, 5, 6], shuffled by Fisher-Yates: for i from 6 down to 1, swap bag[i] and bag[j] with
+  j = word % (i + 1), word being the (6 - i)-th 8 bytes little endian word of the digest
+
+Version 0 (legacy): bags shuffled in sequence by random.Random(seed).shuffle and dealt from the end, as sessions
+created before the versioned randomizer. Seeking to a bag shuffles every bag before it.
+"""
+import hashlib
+import random
+from typing import Iterator, List
+
+BAG_SIZE = 7
+LEGACY_VERSION = 0
+VERSION = 1
+_PERSON = b"pytris 7-bag v1"
+
+
+class BagRandomizer:
+    """
+        Counter-based 7-bag randomizer (version 1)
+    """
+    version = VERSION
+
+    def __init__(self, seed: str):
+        self.seed = seed
+        self._seed_hash = hashlib.blake2b(seed.encode("utf-8"), person=_PERSON)
+
+    def bag(self, index: int) -> List[int]:
+        """
+        :return: pieces of the bag at given index (0 for the first bag), in dealing order
+        """
+        h = self._seed_hash.copy()
+        h.update(index.to_bytes(8, "little"))
+        digest = h.digest()
+        bag = list(range(BAG_SIZE))
+        for i in range(BAG_SIZE - 1, 0, -1):
+            offset = (BAG_SIZE - 1 - i) * 8
+            j = int.from_bytes(digest[offset:offset + 8], "little") % (i + 1)
+            bag[i], bag[j] = bag[j], bag[i]
+        return bag
+
+    def piece(self, index: int) -> int:
+        """
+        :return: piece at given index of the sequence (0 for the first piece)
+        """
+        return self.bag(index // BAG_SIZE)[index % BAG_SIZE]
+
+    def pieces(self, start: int = 0) -> Iterator[int]:
+        """
+        :return: endless iterator of the pieces from given index, for lookahead of any length
+        """
+        bag_index, offset = divmod(start, BAG_SIZE)
+        while True:
+            yield from self.bag(bag_index)[offset:]
+            bag_index += 1
+            offset = 0
+
+
+class LegacyBagRandomizer(BagRandomizer):
+    """
+        Sequential random.Random 7-bag randomizer (version 0), bags are kept once shuffled
+    """
+    version = LEGACY_VERSION
+
+    def __init__(self, seed: str):
+        self.seed = seed
+        self._random = random.Random(seed)
+        self._bags: List[List[int]] = []
+
+    def bag(self, index: int) -> List[int]:
+        while len(self._bags) <= index:
+            bag = list(range(BAG_SIZE))
+            self._random.shuffle(bag)
+            self._bags.append(bag[::-1])
+        return list(self._bags[index])
+
+
+def new_randomizer(seed: str, version: int = VERSION) -> BagRandomizer:
+    """
+    :return: randomizer of given version for the seed
+    """
+    if version == VERSION:
+        return BagRandomizer(seed)
+    if version == LEGACY_VERSION:
+        return LegacyBagRandomizer(seed)
+    raise ValueError(f"Unsupported randomizer version {version}")
@@ -0,0 +1,255 @@
+"""
+Input replays: record the inputs of a game in a compact binary file, and play them back through the game engine.
+
+File format:
+- magic and format version
+- header: varint length followed by a JSON object: game mode, DAS/ARR/SDF settings, key names (in key mask bit order,
+  the KEY_BITS order of the recording version)
+  and the session state (with its seed) before the first piece spawned
+- one record per frame: a flags byte, the frame time in milliseconds (varint), if some keys changed,
+  the XOR of the pressed keys masks of this frame and the previous frame (varint) and, if some keys were tapped
+  (pressed and released during the frame), the mask of the tapped keys (varint)
+
+A frame usually takes 2 bytes. Replaying the frames through the engine gives the same session state as the game.
+"""
+import json
+import os
+import queue
+import threading
+import time
+from typing import BinaryIO, Iterator, List, Optional, Tuple
+
+from pytris.engine import GameState
+from pytris.keys import KEY_BITS, Key, KeyState
+from pytris.sessionstate import SessionState
+
+MAGIC = b"PTRP"
+# version 2: DAS, ARR and SDF are applied in milliseconds, version 1 replays do not play back the same
+VERSION = 2
+REPLAY_DIR = "replays"
+REPLAY_EXTENSION = ".ptrp"
+# replay files kept in the replay directory, the oldest ones are deleted when a new game is recorded
+MAX_REPLAYS = 20
+
+FLAG_GRAVITY = 1
+FLAG_LOCK_TICK = 2
+FLAG_KEYS = 4
+FLAG_TAPS = 8
+
+# frames kept in memory before being handed to the writer thread
+FRAMES_PER_CHUNK = 64
+
+
+def write_varint(buffer: bytearray, value: int):
+    while value > 0x7F:
+        buffer.append(value & 0x7F | 0x80)
+        value >>= 7
+    buffer.append(value)
+
+
+def read_varint(data: bytes, offset: int) -> Tuple[int, int]:
+    """
+    :return: value, offset after the value
+    """
+    value = 0
+    shift = 0
+    while True:
+        byte = data[offset]
+        offset += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, offset
+        shift += 7
+
+
+def new_replay_path(game_mode: int) -> str:
+    """
+    :return: path of a new replay file, the oldest replays over MAX_REPLAYS are deleted
+    """
+    if os.path.isdir(REPLAY_DIR):
+        # names start with the recording time
+        replays = sorted(name for name in os.listdir(REPLAY_DIR) if name.endswith(REPLAY_EXTENSION))
+        for name in replays[:max(0, len(replays) - MAX_REPLAYS + 1)]:
+            os.remove(os.path.join(REPLAY_DIR, name))
+    return os.path.join(REPLAY_DIR, f"{time.strftime('%Y%m%d-%H%M%S')}-mode{game_mode}{REPLAY_EXTENSION}")
+
+
+def _header_state(session: SessionState) -> dict:
+    state = session.get_state()
+    state["seed"] = session.seed
+    return json.loads(json.dumps(state))
+
+
+class _Writer(threading.Thread):
+    """
+        Write chunks of bytes to a file, outside of the game loop
+    """
+
+    def __init__(self, file: BinaryIO):
+        super().__init__(daemon=True)
+        self._file = file
+        self.chunks: "queue.Queue[Optional[bytes]]" = queue.Queue()
+
+    def run(self):
+        while True:
+            chunk = self.chunks.get()
+            if chunk is None:
+                break
+            self._file.write(chunk)
+        self._file.close()
+
+
+class ReplayRecorder:
+    """
+        Record the inputs of one game. Frames are encoded in the game loop, and written to the file
+        by a background thread
+    """
+
+    def __init__(self, path: str, session: SessionState, game_mode: int, das: int, arr: float, sdf: float):
+        """
+        Start recording, the session must not have started yet (no piece spawned)
+        """
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._keys: List[Key] = list(KEY_BITS)
+        self._last_mask = 0
+        self._frames = 0
+        self._buffer = bytearray(MAGIC)
+        self._buffer.append(VERSION)
+        header = json.dumps({
+            "game_mode": game_mode,
+            "das": das,
+            "arr": arr,
+            "sdf": sdf,
+            "keys": [key.value for key in self._keys],
+            "state": _header_state(session)
+        }).encode("utf-8")
+        write_varint(self._buffer, len(header))
+        self._buffer += header
+        self._writer = _Writer(open(path, "wb"))
+        self._writer.start()
+        self.closed = False
+
+    def record(self, keys: KeyState, time_delta: int, gravity: bool = False, lock_tick: bool = False):
+        """
+        Record one frame, with the same arguments as GameState.step
+        """
+        mask = keys.pressing
+        changed = mask ^ self._last_mask
+        # pressed keys not explained by a press transition
+        taps = keys.pressed & ~(mask & ~self._last_mask)
+        self._last_mask = mask
+        flags = (FLAG_GRAVITY if gravity else 0) | (FLAG_LOCK_TICK if lock_tick else 0) | \
+            (FLAG_KEYS if changed else 0) | (FLAG_TAPS if taps else 0)
+        self._buffer.append(flags)
+        write_varint(self._buffer, time_delta)
+        if changed:
+            write_varint(self._buffer, changed)
+        if taps:
+            write_varint(self._buffer, taps)
+        self._frames += 1
+        if self._frames % FRAMES_PER_CHUNK == 0:
+            self._writer.chunks.put(bytes(self._buffer))
+            self._buffer.clear()
+
+    def close(self):
+        """
+        Write the remaining frames and close the file (without waiting for the writes to finish)
+        """
+        if self.closed:
+            return
+        self.closed = True
+        self._writer.chunks.put(bytes(self._buffer))
+        self._writer.chunks.put(None)
+
+    def join(self):
+        """
+        Wait for the file to be written, after close
+        """
+        self._writer.join()
+
+
+class Replay:
+    """
+        Recorded game, read from a replay file
+    """
+
+    def __init__(self, data: bytes):
+        if data[:len(MAGIC)] != MAGIC:
+            raise ValueError("Not a replay file")
+        if data[len(MAGIC)] != VERSION:
+            raise ValueError(f"Unsupported replay version {data[len(MAGIC)]}")
+        length, offset = read_varint(data, len(MAGIC) + 1)
+        header = json.loads(data[offset:offset + length].decode("utf-8"))
+        self.game_mode: int = header["game_mode"]
+        self.das: int = header["das"]
+        self.arr: float = header["arr"]
+        self.sdf: float = header["sdf"]
+        self.keys: List[str] = header["keys"]
+        self.state: dict = header["state"]
+        self._data = data
+        self._frames_offset = offset + length
+
+    @classmethod
+    def load(cls, path: str) -> "Replay":
+        with open(path, "rb") as f:
+            return cls(f.read())
+
+    def _key_bits(self) -> List[int]:
+        """
+        :return: KEY_BITS mask of each recorded key bit, 0 for keys unknown to this version
+        """
+        values = {key.value: key for key in Key}
+        return [KEY_BITS[values[name]] if name in values else 0 for name in self.keys]
+
+    @staticmethod
+    def _to_mask(recorded: int, key_bits: List[int]) -> int:
+        mask = 0
+        for bit, key_bit in enumerate(key_bits):
+            if recorded >> bit & 1:
+                mask |= key_bit
+        return mask
+
+    def frames(self) -> Iterator[Tuple[KeyState, int, bool, bool]]:
+        """
+        :return: iterator of (key state, time delta, gravity, lock tick), one per frame
+        """
+        key_bits = self._key_bits()
+        # recorded with the same keys, masks are used as they are
+        same_bits = key_bits == [1 << bit for bit in range(len(key_bits))]
+        data = self._data
+        offset = self._frames_offset
+        mask = 0
+        keys = KeyState()
+        while offset < len(data):
+            flags = data[offset]
+            time_delta, offset = read_varint(data, offset + 1)
+            last_mask = mask
+            if flags & FLAG_KEYS:
+                changed, offset = read_varint(data, offset)
+                mask ^= changed if same_bits else self._to_mask(changed, key_bits)
+            taps = 0
+            if flags & FLAG_TAPS:
+                taps, offset = read_varint(data, offset)
+                if not same_bits:
+                    taps = self._to_mask(taps, key_bits)
+            if mask != last_mask or taps or keys.pressed or keys.released:
+                keys = KeyState(mask & ~last_mask | taps, mask, last_mask & ~mask | taps & ~mask)
+            yield keys, time_delta, bool(flags & FLAG_GRAVITY), bool(flags & FLAG_LOCK_TICK)
+
+    def play(self, session: Optional[SessionState] = None) -> SessionState:
+        """
+        Play the recorded frames through the engine
+        :param session: session to play in, a new one if not given
+        :return: session at the end of the replay
+        """
+        session = SessionState() if session is None else session
+        session.load_state(self.state)
+        state = GameState(session, self.game_mode, self.das, self.arr, self.sdf)
+        state.reset()
+        state.start()
+        for keys, time_delta, gravity, lock_tick in self.frames():
+            state.step(keys, time_delta, gravity, lock_tick)
+        return session
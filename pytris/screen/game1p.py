@@ -6,103 +6,120 @@ import sys
 import pygame
 from pygame.locals import *
 
+from pytris.gameloop import GameLoop
 from pytris.keymanager import Key, KeyManager
 from pytris.player import Player
+from pytris.profiler import profiler
 from pytris.playersettings import PlayerSettings
 from pytris.screen.gameresult1p import SinglePlayerResultWindow
 from pytris.session import GameSession
 from pytris.soundmanager import SoundManager
+from pytris.viewport import Viewport
 
 
 class SinglePlayerGameScreen:
     """
         Main single player game screen
     """
-    def __init__(self, size, window, display_surface, clock, gui_manager,
+    # render frame rate cap, 0 for uncapped (game logic runs at the game loop tick rate)
+    FRAME_RATE = 60
+
+    def __init__(self, size, viewport: Viewport, clock, gui_manager,
                  keyboard_manager: KeyManager, settings: PlayerSettings, sound: SoundManager, game_mode: int,
                  session: GameSession = None):
         self.size = size
         self.gui_manager = gui_manager
-        self.display_surface = display_surface
         self.clock = clock
-        self.win = window
+        self.viewport = viewport
         self.game_mode = game_mode
         self.km = keyboard_manager
         self.settings = settings
         self.sound = sound
-        self.gravity_tick_event = pygame.event.custom_type()
-        self.lock_tick_event = pygame.event.custom_type()
+        self.game_loop = GameLoop()
         self.session = GameSession() if session is None else session
         self.player = Player(self.gui_manager, self.km, self.settings, self.sound, self.session, self.game_mode)
-        self._result_window = SinglePlayerResultWindow(size, window, display_surface, clock, gui_manager, self.player)
+        self._result_window = SinglePlayerResultWindow(size, viewport, clock, gui_manager, self.player)
         self._loop = True
 
     def init_ui(self):
         self._result_window.init_ui()
 
     def _run(self):
-        pygame.time.set_timer(self.gravity_tick_event, 1000)
-        pygame.time.set_timer(self.lock_tick_event, 500)
         self.player.reset()
         self.player.start()
-        go_down = False
-        lock_tick = False
+        self.game_loop.reset()
+        self.km.reset()
         reset = False
         time_delta = 0
 
         display_game = True
         display_result = True
         while display_game:
+            frame_start = profiler.begin()
+            start = frame_start
             pygame.display.update()
+            profiler.end("display.update", start)
+
+            start = profiler.begin()
             for event in pygame.event.get():
-                if event.type == self.gravity_tick_event:
-                    go_down = True
-                if event.type == self.lock_tick_event:
-                    lock_tick = True
                 if event.type == QUIT:
                     pygame.quit()
                     sys.exit()
+                self.km.process_event(event)
                 self.gui_manager.process_events(event)
+                profiler.process_event(event)
+            profiler.end("events", start)
 
+            start = profiler.begin()
             self.session.update()
+            profiler.end("session.update", start)
+
+            # game logic runs at the tick rate of the game loop, whatever the frame rate
+            ticks = self.game_loop.advance(time_delta)
+            # end time of the first tick of the frame, the last one ends now (minus the time left to the next tick)
+            tick_end = pygame.time.get_ticks() - (ticks - 1 + self.game_loop.alpha) * self.game_loop.tick_time
+            for tick in range(ticks):
+                # need to update keyboard manager before updating player,
+                # each tick gets the key events that happened during its time
+                start = profiler.begin()
+                self.km.update(tick_end if tick < ticks - 1 else None)
+                tick_end += self.game_loop.tick_time
+                profiler.end("km.update", start)
+                if self.km.state.is_pressed(Key.EXIT_KEY):
+                    display_game = False
+                    self._loop = False
+                    self.player.end_replay()
+                    self.session.exit_session()
+                    break
+                if not reset and self.km.state.is_pressed(Key.RESET_KEY) and self.session.session_id is None:
+                    # reset the game (only local games)
+                    self.player.reset()
+                    self.player.start()
+                    self.game_loop.reset()
+                    reset = True
+                elif not self.km.state.is_pressed(Key.RESET_KEY):
+                    reset = False
 
-            # need to update keyboard manager before updating player
-            self.km.update()
-            if self.km.pressed[Key.EXIT_KEY]:
-                display_game = False
-                self._loop = False
-                self.session.exit_session()
+                if self.player.game_finished():
+                    break
+                start = profiler.begin()
+                self.player.step(*self.game_loop.tick())
+                profiler.end("player.step", start)
+            if not display_game:
                 continue
-            if not reset and self.km.pressed[Key.RESET_KEY] and self.session.session_id is None:
-                # reset the game (only local games)
-                self.player.reset()
-                self.player.start()
-                go_down = False
-                reset = True
-            elif not self.km.pressed[Key.RESET_KEY]:
-                reset = False
 
             if not self.player.game_finished():
-                if self.player.locked:
-                    self.player.clear_lines()
-                    self.session.set_next_in_queue()
-                    self.player.spawn_piece()
-                else:
-                    if go_down:
-                        self.player.go_down()
-                        go_down = False
-                    if lock_tick:
-                        self.player.lock_tick()
-                        lock_tick = False
-
-                self.player.update(time_delta)
+                start = profiler.begin()
                 self.gui_manager.update(time_delta / 1000.0)
+                profiler.end("gui_manager.update", start)
 
-                self.display_surface.fill((150, 150, 150))
-                self.player.draw(self.display_surface)
-                self.gui_manager.draw_ui(self.display_surface)
-                scaled = pygame.transform.smoothscale(self.display_surface, self.win.get_size())
-                self.win.blit(scaled, (0, 0))
+                start = profiler.begin()
+                self.viewport.surface.fill((150, 150, 150))
+                self.player.draw(self.viewport.surface)
+                profiler.end("player.draw", start)
+                start = profiler.begin()
+                self.gui_manager.draw_ui(self.viewport.surface)
+                profiler.end("gui_manager.draw_ui", start)
             elif display_result and not self.player.topped_out:
                 self._result_window.run()
                 display_result = False
@@ -111,11 +128,11 @@ class SinglePlayerGameScreen:
                     display_game = False
                 elif self._result_window.retry:
                     display_game = False
-            else:
-                scaled = pygame.transform.smoothscale(self.display_surface, self.win.get_size())
-                self.win.blit(scaled, (0, 0))
 
-            time_delta = self.clock.tick(60)
+            profiler.end("frame", frame_start)
+            start = profiler.begin()
+            time_delta = self.clock.tick(self.FRAME_RATE)
+            profiler.end("clock.tick", start)
 
     def run(self):
         while self._loop:
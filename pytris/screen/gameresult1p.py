@@ -9,15 +9,16 @@ from pygame.locals import *
 
 from pytris.gamemode import SPRINT_MODE, ULTRA_MODE
 from pytris.player import Player
+from pytris.profiler import profiler
+from pytris.viewport import Viewport
 
 
 class SinglePlayerResultWindow:
-    def __init__(self, size, window, display_surface, clock, gui_manager, player: Player):
+    def __init__(self, size, viewport: Viewport, clock, gui_manager, player: Player):
         self.size = size
         self.gui_manager = gui_manager
-        self.display_surface = display_surface
         self.clock = clock
-        self.win = window
+        self.viewport = viewport
         self.player = player
         self.result_window: pygame_gui.elements.UIWindow = None
         self.menu_button = None
@@ -100,6 +101,7 @@ class SinglePlayerResultWindow:
         time_delta = 0
         display_results = True
         while display_results:
+            frame_start = profiler.begin()
             pygame.display.update()
             for event in pygame.event.get():
                 if event.type == pygame_gui.UI_WINDOW_CLOSE:
@@ -115,13 +117,17 @@ class SinglePlayerResultWindow:
                     pygame.quit()
                     sys.exit()
                 self.gui_manager.process_events(event)
+                profiler.process_event(event)
             self.gui_manager.update(time_delta / 1000.0)
 
-            self.display_surface.fill((150, 150, 150))
-            self.player.draw(self.display_surface)
-            self.gui_manager.draw_ui(self.display_surface)
-            scaled = pygame.transform.smoothscale(self.display_surface, self.win.get_size())
-            self.win.blit(scaled, (0, 0))
+            self.viewport.surface.fill((150, 150, 150))
+            self.player.draw(self.viewport.surface)
+            start = profiler.begin()
+            self.gui_manager.draw_ui(self.viewport.surface)
+            profiler.end("gui_manager.draw_ui", start, "game results")
 
+            profiler.end("frame", frame_start, "game results")
+            start = profiler.begin()
             time_delta = self.clock.tick(60)
+            profiler.end("clock.tick", start, "game results")
         self.result_window.hide()
@@ -10,22 +10,23 @@ from pygame.locals import *
 from pytris.gamemode import *
 from pytris.keymanager import KeyManager
 from pytris.playersettings import PlayerSettings
+from pytris.profiler import profiler
 from pytris.screen.constants import ONLINE_MENU, OFFLINE_MENU
 from pytris.screen.options import OptionsWindow
 from pytris.soundmanager import SoundManager
+from pytris.viewport import Viewport
 
 
 class MainMenuScreen:
     """
         Main menu screen
     """
-    def __init__(self, size, window, display_surface, clock, gui_manager,
+    def __init__(self, size, viewport: Viewport, clock, gui_manager,
                  key_manager: KeyManager, settings: PlayerSettings, sound: SoundManager):
         self.size = size
         self.gui_manager = gui_manager
-        self.display_surface = display_surface
         self.clock = clock
-        self.win = window
+        self.viewport = viewport
         self.online_button = None
         self.offline_button = None
         self.options_button = None
@@ -55,6 +56,7 @@ class MainMenuScreen:
         display_menu = True
         time_delta = 0
         while display_menu:
+            frame_start = profiler.begin()
             pygame.display.update()
             for event in pygame.event.get():
                 if event.type == pygame_gui.UI_BUTTON_PRESSED:
@@ -69,8 +71,7 @@ class MainMenuScreen:
                         self.offline_button.disable()
                         self.options_button.disable()
 
-                        options = OptionsWindow(self.size, self.win, self.display_surface,
-                                                self.clock, self.gui_manager,
+                        options = OptionsWindow(self.size, self.viewport, self.clock, self.gui_manager,
                                                 self.key_manager, self.settings, self.sound)
                         options.init_ui()
                         options.run()
@@ -81,13 +82,17 @@ class MainMenuScreen:
                     pygame.quit()
                     sys.exit()
                 self.gui_manager.process_events(event)
+                profiler.process_event(event)
             self.gui_manager.update(time_delta / 1000.0)
-            self.display_surface.fill((150, 150, 150))
-            self.gui_manager.draw_ui(self.display_surface)
+            self.viewport.surface.fill((150, 150, 150))
+            start = profiler.begin()
+            self.gui_manager.draw_ui(self.viewport.surface)
+            profiler.end("gui_manager.draw_ui", start, "main menu")
 
-            scaled = pygame.transform.smoothscale(self.display_surface, self.win.get_size())
-            self.win.blit(scaled, (0, 0))
+            profiler.end("frame", frame_start, "main menu")
+            start = profiler.begin()
             time_delta = self.clock.tick(60)
+            profiler.end("clock.tick", start, "main menu")
 
         self.online_button.hide()
         self.offline_button.hide()
@@ -10,22 +10,23 @@ from pygame.locals import *
 from pytris.gamemode import *
 from pytris.keymanager import KeyManager
 from pytris.playersettings import PlayerSettings
+from pytris.profiler import profiler
 from pytris.screen.options import OptionsWindow
 from pytris.session import GameSession
 from pytris.soundmanager import SoundManager
+from pytris.viewport import Viewport
 
 
 class OnlineMenuScreen:
     """
         Main menu screen
     """
-    def __init__(self, size, window, display_surface, clock, gui_manager,
+    def __init__(self, size, viewport: Viewport, clock, gui_manager,
                  key_manager: KeyManager, settings: PlayerSettings, sound: SoundManager):
         self.size = size
         self.gui_manager = gui_manager
-        self.display_surface = display_surface
         self.clock = clock
-        self.win = window
+        self.viewport = viewport
         self.game_mode = -1
         self.back_button: pygame_gui.elements.UIButton = None
         self.error_window: pygame_gui.elements.UIWindow = None
@@ -65,6 +66,7 @@ class OnlineMenuScreen:
         display_menu = True
         time_delta = 0
         while display_menu:
+            frame_start = profiler.begin()
             pygame.display.update()
             for event in pygame.event.get():
                 if event.type == pygame_gui.UI_WINDOW_CLOSE:
@@ -88,6 +90,7 @@ class OnlineMenuScreen:
                     pygame.quit()
                     sys.exit()
                 self.gui_manager.process_events(event)
+                profiler.process_event(event)
 
             if self.session:
                 self.session.update()
@@ -103,12 +106,15 @@ class OnlineMenuScreen:
                     display_menu = False
 
             self.gui_manager.update(time_delta / 1000.0)
-            self.display_surface.fill((150, 150, 150))
-            self.gui_manager.draw_ui(self.display_surface)
+            self.viewport.surface.fill((150, 150, 150))
+            start = profiler.begin()
+            self.gui_manager.draw_ui(self.viewport.surface)
+            profiler.end("gui_manager.draw_ui", start, "online menu")
 
-            scaled = pygame.transform.smoothscale(self.display_surface, self.win.get_size())
-            self.win.blit(scaled, (0, 0))
+            profiler.end("frame", frame_start, "online menu")
+            start = profiler.begin()
             time_delta = self.clock.tick(60)
+            profiler.end("clock.tick", start, "online menu")
 
         self.session_join_text.hide()
         self.back_button.hide()
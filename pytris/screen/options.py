@@ -10,20 +10,21 @@ from pygame.locals import *
 
 from pytris.keymanager import Key, KeyManager
 from pytris.playersettings import PlayerSettings
+from pytris.profiler import profiler
 from pytris.soundmanager import SoundManager
+from pytris.viewport import Viewport
 
 
 class OptionsWindow:
     """
         Window to modify different player settings
     """
-    def __init__(self, size, window, display_surface, clock, gui_manager,
+    def __init__(self, size, viewport: Viewport, clock, gui_manager,
                  key_manager: KeyManager, settings: PlayerSettings, sound: SoundManager):
         self.size = size
         self.gui_manager = gui_manager
-        self.display_surface = display_surface
         self.clock = clock
-        self.win = window
+        self.viewport = viewport
         self.options_window: pygame_gui.elements.UIWindow = None
         self.key_manager = key_manager
         self.settings = settings
@@ -147,6 +148,7 @@ class OptionsWindow:
         time_delta = 0
         display_options = True
         while display_options:
+            frame_start = profiler.begin()
             pygame.display.update()
             for event in pygame.event.get():
                 if event.type == self.playback_event:
@@ -186,13 +188,17 @@ class OptionsWindow:
                     pygame.quit()
                     sys.exit()
                 self.gui_manager.process_events(event)
+                profiler.process_event(event)
 
             self.gui_manager.update(time_delta / 1000.0)
 
-            self.display_surface.fill((150, 150, 150))
-            self.gui_manager.draw_ui(self.display_surface)
-            scaled = pygame.transform.smoothscale(self.display_surface, self.win.get_size())
-            self.win.blit(scaled, (0, 0))
+            self.viewport.surface.fill((150, 150, 150))
+            start = profiler.begin()
+            self.gui_manager.draw_ui(self.viewport.surface)
+            profiler.end("gui_manager.draw_ui", start, "options")
 
+            profiler.end("frame", frame_start, "options")
+            start = profiler.begin()
             time_delta = self.clock.tick(60)
+            profiler.end("clock.tick", start, "options")
         self.options_window.hide()
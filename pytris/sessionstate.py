@@ -0,0 +1,243 @@
+"""
+    Game session data state, without any network or display dependency
+"""
+import os
+from base64 import b64encode
+from typing import Iterator, Optional, Tuple
+
+from pytris import zobrist
+from pytris.board import Board
+from pytris.piecequeue import PieceQueue
+from pytris.randomizer import BagRandomizer, LEGACY_VERSION, new_randomizer
+
+# Zobrist keys of the session state parts other than the board
+_CURRENT_PIECE_KEYS = zobrist.random_keys("current piece", 7)
+_HOLD_PIECE_KEYS = zobrist.random_keys("hold piece", 7)
+_HOLT_KEY = zobrist.random_keys("holt", 1)[0]
+
+
+class SessionState:
+    """
+        Game session data: board, pieces, queue, timer and stats
+    """
+
+    def __init__(self):
+        self.randomizer: Optional[BagRandomizer] = None
+        self.seed = None
+        self.current_piece = None
+        self.hold_piece = None
+        self.holt = False
+        self.queue = PieceQueue()
+        self.piece_count = 0
+        self.timer = 0
+        self.stats = {}
+        self.board = Board()
+
+    def get_general_stats(self) -> dict:
+        general_stats = {
+            "T-spin": 0,
+            "T-spin mini": 0,
+            "T-spin Single": 0,
+            "T-spin Double": 0,
+            "T-spin Triple": 0,
+            "T-spin mini Single": 0,
+            "T-spin mini Double": 0,
+            "Single": 0,
+            "Double": 0,
+            "Triple": 0,
+            "Quad": 0,
+            "Max combo": 0,
+            "Max Back-to-Back": 0,
+            "Perfect Clears": 0
+        }
+        for stat in general_stats:
+            general_stats[stat] = self.stats[stat]
+        return general_stats
+
+    @property
+    def grid(self):
+        """
+        Board cells in the JSON session format (list of lines of cell types)
+        """
+        return self.board.to_grid()
+
+    @grid.setter
+    def grid(self, new_grid):
+        self.board = Board(new_grid)
+
+    @property
+    def zobrist_hash(self) -> int:
+        """
+        64 bit Zobrist hash of the game state: used cells, current and hold pieces, holt flag and queue position.
+        The board hash is updated by the board on each change, the other parts are XORed in here.
+        """
+        key = self.board.hash ^ zobrist.count_key(self.piece_count)
+        if self.current_piece is not None:
+            key ^= _CURRENT_PIECE_KEYS[self.current_piece]
+        if self.hold_piece is not None:
+            key ^= _HOLD_PIECE_KEYS[self.hold_piece]
+        if self.holt:
+            key ^= _HOLT_KEY
+        return key
+
+    @property
+    def successive_pc(self):
+        return self.stats["Successive PC"]
+
+    @successive_pc.setter
+    def successive_pc(self, new_successive):
+        self.stats["Successive PC"] = new_successive
+
+    @property
+    def max_successive_pc(self):
+        return self.stats["Max successive PC"]
+
+    @max_successive_pc.setter
+    def max_successive_pc(self, new_max):
+        self.stats["Max successive PC"] = new_max
+
+    @property
+    def level(self):
+        return self.stats["Level"]
+
+    @level.setter
+    def level(self, new_level):
+        self.stats["Level"] = new_level
+
+    @property
+    def lines_cleared(self):
+        return self.stats["Lines cleared"]
+
+    @lines_cleared.setter
+    def lines_cleared(self, new_cleared):
+        self.stats["Lines cleared"] = new_cleared
+
+    @property
+    def pieces_since_pc(self):
+        return self.stats["Pieces since PC"]
+
+    @pieces_since_pc.setter
+    def pieces_since_pc(self, pieces_nb):
+        self.stats["Pieces since PC"] = pieces_nb
+
+    @property
+    def used_pieces(self):
+        return self.piece_count \
+                - (1 if self.hold_piece is not None else 0) \
+                - (1 if self.current_piece is not None else 0)
+
+    @property
+    def score(self):
+        return self.stats["Score"]
+
+    @score.setter
+    def score(self, new_score):
+        self.stats["Score"] = new_score
+
+    @property
+    def combo(self):
+        return self.stats["Combo"]
+
+    @combo.setter
+    def combo(self, new_combo):
+        self.stats["Combo"] = new_combo
+
+    @property
+    def back_to_back(self):
+        return self.stats["B2B"]
+
+    @back_to_back.setter
+    def back_to_back(self, new_b2b):
+        self.stats["B2B"] = new_b2b
+
+    def init_state(self, seed: str = None):
+        """
+        Start a new game with given seed (random if not given)
+        """
+        self.current_piece = None
+        self.hold_piece = None
+        self.holt = False
+        self.piece_count = 0
+        self.timer = 0
+        self.seed = b64encode(os.urandom(64)).decode('utf-8') if seed is None else seed
+        self.randomizer = new_randomizer(self.seed)
+        self.queue.reset(self.randomizer)
+        self.board = Board()
+        self.stats = {
+            "Level": 1,
+            "Lines cleared": 0,
+            "Score": 0,
+            "B2B": -1,
+            "Combo": -1,
+            "T-spin": 0,
+            "T-spin mini": 0,
+            "T-spin Single": 0,
+            "T-spin Double": 0,
+            "T-spin Triple": 0,
+            "T-spin mini Single": 0,
+            "T-spin mini Double": 0,
+            "Single": 0,
+            "Double": 0,
+            "Triple": 0,
+            "Quad": 0,
+            "Max combo": 0,
+            "Max Back-to-Back": 0,
+            "Perfect Clears": 0,
+            "Successive PC": 0,
+            "Max successive PC": 0,
+            "Pieces since PC": 0
+        }
+
+    def load_state(self, data: dict):
+        """
+        Load session data (JSON session format) and restore the queue from the seed
+        """
+        self.seed = data["seed"]
+        # sessions saved without randomizer version use the legacy one
+        self.randomizer = new_randomizer(self.seed, data.get("randomizer", LEGACY_VERSION))
+        self.current_piece = data["current_piece"]
+        self.hold_piece = data["hold_piece"]
+        self.holt = data["holt"]
+        self.piece_count = data["piece_count"]
+        self.timer = data["timer"]
+        self.stats = data["stats"]
+        self.grid = data["grid"]
+        self.queue.reset(self.randomizer, self.piece_count)
+
+    def get_state(self) -> dict:
+        """
+        :return: session data in the JSON session format (without the seed)
+        """
+        return {
+            "current_piece": self.current_piece,
+            "hold_piece": self.hold_piece,
+            "holt": self.holt,
+            "piece_count": self.piece_count,
+            "randomizer": self.randomizer.version,
+            "timer": self.timer,
+            "stats": self.stats,
+            "grid": self.grid
+        }
+
+    def update_time(self, time_delta):
+        self.timer += time_delta
+
+    def set_next_in_queue(self, start: bool = False):
+        if start and self.current_piece is not None:
+            # already a starting piece, no need to take next piece
+            return
+        self.current_piece = self.queue.pop()
+        self.piece_count += 1
+        self.holt = False
+
+    def get_preview(self) -> Tuple[int, ...]:
+        """
+        :return: next pieces shown in the preview, next one first
+        """
+        return self.queue.preview
+
+    def lookahead(self) -> Iterator[int]:
+        """
+        :return: endless iterator of the pieces dealt after the current one, next one first
+        """
+        return self.queue.lookahead()
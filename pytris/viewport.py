@@ -0,0 +1,24 @@
+"""
+    Game window and its rendering surface
+"""
+from typing import Tuple
+
+import pygame
+
+
+class Viewport:
+    """
+        Game window. Screens are laid out at the logical size, and the window keeps that size: screens draw directly
+        on the window surface, and frames are never resampled.
+    """
+
+    def __init__(self, logical_size: Tuple[int, int]):
+        self.logical_size = logical_size
+        self.window = pygame.display.set_mode(logical_size)
+
+    @property
+    def surface(self) -> pygame.Surface:
+        """
+            Surface to draw the current frame on, of the logical size
+        """
+        return self.window
@@ -0,0 +1,71 @@
+"""
+Zobrist hashing keys.
+
+A state hash is the XOR of the random keys of its parts (used cells, pieces...), so it can be updated
+incrementally by XORing the keys of the parts that change. Each key table comes from its own fixed seed:
+hashes are the same in every process and on every machine.
+"""
+import random
+from typing import List
+
+KEY_BITS = 64
+KEY_MASK = (1 << KEY_BITS) - 1
+# line keys are looked up by chunks of columns
+CHUNK_BITS = 5
+
+
+def random_keys(name: str, count: int) -> List[int]:
+    """
+    :return: count random 64 bit keys, always the same for a given table name
+    """
+    rng = random.Random(f"pytris zobrist {name}")
+    return [rng.getrandbits(KEY_BITS) for _ in range(count)]
+
+
+def cell_keys(height: int, width: int) -> List[List[int]]:
+    """
+    :return: keys of used cells, by line and column
+    """
+    keys = random_keys("cells", height * width)
+    return [keys[line * width:(line + 1) * width] for line in range(height)]
+
+
+def line_key_tables(cells: List[List[int]]) -> List[List[List[int]]]:
+    """
+    :return: tables[line][chunk][chunk bitmask] -> XOR of the keys of the used cells of the chunk,
+    to hash a whole line bitmask with one lookup per chunk (see line_key)
+    """
+    tables = []
+    for line_keys in cells:
+        chunks = []
+        for start in range(0, len(line_keys), CHUNK_BITS):
+            chunk_keys = line_keys[start:start + CHUNK_BITS]
+            table = [0] * (1 << len(chunk_keys))
+            for mask in range(1, len(table)):
+                # one more bit than an already computed mask
+                low_bit = (mask & -mask).bit_length() - 1
+                table[mask] = table[mask & (mask - 1)] ^ chunk_keys[low_bit]
+            chunks.append(table)
+        tables.append(chunks)
+    return tables
+
+
+def line_key(tables: List[List[int]], mask: int) -> int:
+    """
+    :return: hash of a line bitmask, given the line tables of line_key_tables
+    """
+    key = 0
+    for table in tables:
+        key ^= table[mask & ((1 << CHUNK_BITS) - 1)]
+        mask >>= CHUNK_BITS
+    return key
+
+
+def count_key(count: int) -> int:
+    """
+    :return: key of a counter value (splitmix64 finalizer), for unbounded counters
+    """
+    value = (count + 0x9E3779B97F4A7C15) & KEY_MASK
+    value = ((value ^ (value >> 30)) * 0xBF58476D1CE4E5B9) & KEY_MASK
+    value = ((value ^ (value >> 27)) * 0x94D049BB133111EB) & KEY_MASK
+    return value ^ (value >> 31)
@@ -9,6 +9,7 @@ from typing import Dict
 
 from PodSixNet.Channel import Channel
 
+from pytrisserver.replayverifier import load_replay_data
 from pytrisserver.sessionmanager import SessionManager
 
 
@@ -57,7 +58,7 @@ class ClientChannel(Channel):
             send_back["status"] = "Session ID was not given"
         else:
             session_id = data["session_id"]
-            send_back["data"] = self.session_manager.get_session(session_id)
+            send_back["data"] = self.session_manager.issue_session(session_id)
         self.Send(send_back)
 
     def Network_update_session(self, data):
@@ -71,6 +72,18 @@ class ClientChannel(Channel):
                 send_back["status"] = res
         self.Send(send_back)
 
+    def Network_submit_replay(self, data):
+        send_back = {"action": "submit_replay_ack", "status": "OK"}
+        if "session_id" not in data or "replay" not in data:
+            send_back["status"] = "Session ID or replay was not given"
+        else:
+            replay_data, res = load_replay_data(data["replay"])
+            if res is None:
+                res = self.session_manager.submit_replay(data["session_id"], self.addr, replay_data)
+            if res:
+                send_back["status"] = res
+        self.Send(send_back)
+
     def Close(self):
         print(f"{self.addr} connection closed")
         if self.session_id:
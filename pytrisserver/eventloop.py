@@ -0,0 +1,193 @@
+"""
+    Event-driven server loop
+
+The loop sleeps until a socket of the server is ready, a timer is due or another thread wakes it, instead of polling
+the sockets in a busy loop. Channels are the PodSixNet (asyncore) dispatchers of the server, their Network_* handlers
+are called as with Server.Pump.
+"""
+import selectors
+import socket
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from PodSixNet.asyncwrapper import asyncore
+from PodSixNet.Server import Server
+
+from pytrisserver.server import MyServer
+
+# time between calls of the session manager flush and sweep, in seconds. Both wait for their own interval
+# before doing any work, these only bound how late they can be
+FLUSH_TIMER = 0.25
+SWEEP_TIMER = 0.1
+
+
+class Timer:
+    """
+        Callback called regularly by the event loop
+    """
+
+    def __init__(self, interval: float, callback: Callable[[], None]):
+        self.interval = interval
+        self.callback = callback
+        self.next_time = time.monotonic() + interval
+
+
+class EventLoop:
+    """
+        Wait for socket readiness (epoll, kqueue... depending on the platform), timers and wake-ups
+    """
+
+    def __init__(self, server: Server, selector: Optional[selectors.BaseSelector] = None):
+        """
+        :param selector: the platform default if not given (epoll on Linux)
+        """
+        self.server = server
+        self._selector = selectors.DefaultSelector() if selector is None else selector
+        # fd -> (dispatcher, events) registered in the selector
+        self._registered: Dict[int, Tuple[asyncore.dispatcher, int]] = {}
+        self._timers: List[Timer] = []
+        # callbacks called when the loop is woken up by wake
+        self._wake_handlers: List[Callable[[], None]] = []
+        self._wake_read, self._wake_write = socket.socketpair()
+        self._wake_read.setblocking(False)
+        self._wake_write.setblocking(False)
+        self._selector.register(self._wake_read, selectors.EVENT_READ)
+        self.running = False
+
+    def add_timer(self, interval: float, callback: Callable[[], None]) -> Timer:
+        timer = Timer(interval, callback)
+        self._timers.append(timer)
+        return timer
+
+    def add_wake_handler(self, callback: Callable[[], None]):
+        self._wake_handlers.append(callback)
+
+    def wake(self):
+        """
+        Wake the loop up to call the wake handlers, can be called from any thread
+        """
+        try:
+            self._wake_write.send(b"\0")
+        except BlockingIOError:
+            # already woken up
+            pass
+
+    def _update_registrations(self):
+        """
+        Register the dispatchers sockets for the events they wait for, as asyncore.poll selects them
+        """
+        socket_map = self.server._map
+        for fd, (dispatcher, _) in list(self._registered.items()):
+            if socket_map.get(fd) is not dispatcher:
+                # closed, its fd may have been reused by a new dispatcher
+                self._selector.unregister(fd)
+                del self._registered[fd]
+        for fd, dispatcher in socket_map.items():
+            events = 0
+            if dispatcher.readable():
+                events |= selectors.EVENT_READ
+            if dispatcher.writable() and not dispatcher.accepting:
+                events |= selectors.EVENT_WRITE
+            registered = self._registered.get(fd)
+            if registered is None:
+                if events:
+                    self._selector.register(fd, events)
+                    self._registered[fd] = (dispatcher, events)
+            elif not events:
+                self._selector.unregister(fd)
+                del self._registered[fd]
+            elif events != registered[1]:
+                self._selector.modify(fd, events)
+                self._registered[fd] = (dispatcher, events)
+
+    def _timeout(self, now: float) -> Optional[float]:
+        if not self._timers:
+            return None
+        return max(0.0, min(timer.next_time for timer in self._timers) - now)
+
+    def run_once(self, timeout: Optional[float] = None):
+        """
+        Wait for the next events and handle them
+        :param timeout: longest wait in seconds, until the next timer if not given
+        """
+        # queued messages are moved to the channels output buffers, closed channels are dropped
+        # (the server never removes them)
+        channels = []
+        for channel in self.server.channels:
+            if channel.connected:
+                if channel.sendqueue:
+                    channel.Pump()
+                channels.append(channel)
+        self.server.channels = channels
+        self._update_registrations()
+        now = time.monotonic()
+        timer_timeout = self._timeout(now)
+        if timeout is None or timer_timeout is not None and timer_timeout < timeout:
+            timeout = timer_timeout
+        woken = False
+        for key, events in self._selector.select(timeout):
+            if key.fileobj is self._wake_read:
+                try:
+                    while self._wake_read.recv(4096):
+                        pass
+                except BlockingIOError:
+                    pass
+                woken = True
+                continue
+            dispatcher = self.server._map.get(key.fd)
+            if dispatcher is None or dispatcher is not self._registered.get(key.fd, (None,))[0]:
+                continue
+            if events & selectors.EVENT_READ:
+                asyncore.read(dispatcher)
+            if events & selectors.EVENT_WRITE and self.server._map.get(key.fd) is dispatcher:
+                asyncore.write(dispatcher)
+        if woken:
+            for handler in self._wake_handlers:
+                handler()
+        now = time.monotonic()
+        for timer in self._timers:
+            if timer.next_time <= now:
+                timer.callback()
+                timer.next_time = now + timer.interval
+
+    def run(self):
+        self.running = True
+        while self.running:
+            self.run_once()
+
+    def stop(self):
+        """
+        Stop the loop after the current iteration, can be called from any thread
+        """
+        self.running = False
+        self.wake()
+
+    def close(self):
+        self._selector.close()
+        self._wake_read.close()
+        self._wake_write.close()
+
+
+def new_server_loop(server: MyServer, selector: Optional[selectors.BaseSelector] = None) -> EventLoop:
+    """
+    :return: event loop of a server, calling its session manager timers and polling its replay verifications
+    """
+    session_manager = server.session_manager
+    loop = EventLoop(server, selector)
+    session_manager.verifier.on_done = loop.wake
+    loop.add_wake_handler(session_manager.poll_verifications)
+    loop.add_timer(FLUSH_TIMER, session_manager.flush)
+    loop.add_timer(SWEEP_TIMER, session_manager.sweep)
+    return loop
+
+
+def serve(server: MyServer, selector: Optional[selectors.BaseSelector] = None):
+    """
+    Run a server until interrupted, then write its sessions
+    """
+    loop = new_server_loop(server, selector)
+    try:
+        loop.run()
+    finally:
+        loop.close()
+        server.session_manager.close()
@@ -0,0 +1,186 @@
+"""
+    Append-only session journal, compacted into a snapshot
+
+Each session mutation appends one JSON line to the journal: {"id": session id, "session": session} when the session
+is saved, {"id": session id} when it is deleted. Records are fsynced by batches, and the journal is compacted
+into a snapshot (the sessions dict, in the sessions.json format) by a background thread once it holds enough records.
+On startup, the snapshot is loaded and the journals are replayed on top of it.
+
+Records hold whole sessions, so replaying a record twice gives the same state: a journal rotated for a compaction
+that did not finish is replayed again on top of the previous snapshot.
+"""
+import json
+import os
+import shutil
+import threading
+import time
+from typing import Dict, Optional
+
+SNAPSHOT_PATH = "sessions.json"
+JOURNAL_PATH = "sessions.journal"
+# records written before being fsynced
+SYNC_BATCH = 64
+# longest time a record waits for its fsync, in seconds (checked by flush)
+SYNC_INTERVAL = 1.0
+# records in the journal before a compaction
+COMPACT_RECORDS = 10000
+
+
+class SessionJournal:
+    """
+        Sessions storage: one record appended per mutation, compaction in the background
+    """
+
+    def __init__(self, snapshot_path: str = SNAPSHOT_PATH, journal_path: str = JOURNAL_PATH,
+                 sync_batch: int = SYNC_BATCH, sync_interval: float = SYNC_INTERVAL,
+                 compact_records: int = COMPACT_RECORDS):
+        self.snapshot_path = snapshot_path
+        self.journal_path = journal_path
+        # journal being compacted
+        self.compacting_path = journal_path + ".compacting"
+        self.sync_batch = sync_batch
+        self.sync_interval = sync_interval
+        self.compact_records = compact_records
+        self._file = None
+        # records in the journal file
+        self.records = 0
+        # records written but not fsynced yet, and time of the oldest one
+        self._unsynced = 0
+        self._unsynced_since = 0.0
+        self._compaction: Optional[threading.Thread] = None
+
+    def load(self) -> Dict[str, dict]:
+        """
+        Read the sessions from the snapshot and the journals, then open the journal to append records
+        :return: sessions dict
+        """
+        sessions: Dict[str, dict] = {}
+        if os.path.exists(self.snapshot_path):
+            with open(self.snapshot_path, "r") as f:
+                sessions = json.load(f)
+        interrupted = os.path.exists(self.compacting_path)
+        self._replay(self.compacting_path, sessions)
+        self.records = self._replay(self.journal_path, sessions)
+        if interrupted:
+            # finish the compaction before the journal is rotated again
+            self._write_snapshot(sessions)
+        self._file = open(self.journal_path, "a", encoding="utf-8")
+        return sessions
+
+    @staticmethod
+    def _replay(path: str, sessions: Dict[str, dict]) -> int:
+        """
+        Apply the records of a journal to the sessions
+        :return: number of records
+        """
+        if not os.path.exists(path):
+            return 0
+        records = 0
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # last record was not fully written
+                    print(f"{path}: ignoring truncated record {records + 1}")
+                    break
+                if "session" in record:
+                    sessions[record["id"]] = record["session"]
+                else:
+                    sessions.pop(record["id"], None)
+                records += 1
+        return records
+
+    def put(self, session_id: str, session: dict):
+        self._append({"id": session_id, "session": session})
+
+    def delete(self, session_id: str):
+        self._append({"id": session_id})
+
+    def _append(self, record: dict):
+        self._file.write(json.dumps(record, separators=(",", ":")) + "\n")
+        self.records += 1
+        if self._unsynced == 0:
+            self._unsynced_since = time.monotonic()
+        self._unsynced += 1
+        if self._unsynced >= self.sync_batch:
+            self.sync()
+
+    def sync(self):
+        """
+        Write the pending records to disk
+        """
+        if self._unsynced == 0:
+            return
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._unsynced = 0
+
+    def flush(self):
+        """
+        Sync the pending records waiting for longer than the sync interval, to call regularly
+        """
+        if self._unsynced and time.monotonic() - self._unsynced_since >= self.sync_interval:
+            self.sync()
+
+    @property
+    def compaction_due(self) -> bool:
+        return self.records >= self.compact_records and not self.compacting
+
+    @property
+    def compacting(self) -> bool:
+        return self._compaction is not None and self._compaction.is_alive()
+
+    def compact(self, sessions: Dict[str, dict]):
+        """
+        Start a new journal, and write a snapshot of the sessions in the background.
+        Session metadata and data dicts are copied: their values must be replaced, not modified in place.
+        """
+        if self.compacting:
+            return
+        self.sync()
+        self._file.close()
+        if os.path.exists(self.compacting_path):
+            # the previous snapshot was not written, its records are kept with the new ones
+            with open(self.journal_path, "r", encoding="utf-8") as journal, \
+                    open(self.compacting_path, "a", encoding="utf-8") as compacting:
+                shutil.copyfileobj(journal, compacting)
+                compacting.flush()
+                os.fsync(compacting.fileno())
+            os.remove(self.journal_path)
+        else:
+            os.replace(self.journal_path, self.compacting_path)
+        self._file = open(self.journal_path, "a", encoding="utf-8")
+        self.records = 0
+        snapshot = {session_id: {part: dict(values) for part, values in session.items()}
+                    for session_id, session in sessions.items()}
+        self._compaction = threading.Thread(target=self._write_snapshot, args=(snapshot,), daemon=True)
+        self._compaction.start()
+
+    def _write_snapshot(self, snapshot: Dict[str, dict]):
+        """
+        Write the snapshot, then remove the compacted journal. On failure the journal is kept, and compacted again
+        with the next one.
+        """
+        temp_path = self.snapshot_path + ".tmp"
+        try:
+            with open(temp_path, "w") as f:
+                json.dump(snapshot, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_path, self.snapshot_path)
+        except OSError as error:
+            print(f"{self.snapshot_path}: snapshot not written, {error}")
+            return
+        os.remove(self.compacting_path)
+
+    def close(self):
+        """
+        Sync the journal and wait for the running compaction
+        """
+        if self._compaction is not None:
+            self._compaction.join()
+        if self._file is not None:
+            self.sync()
+            self._file.close()
+            self._file = None
@@ -0,0 +1,118 @@
+"""
+    Verify session results by re-simulating input replays in worker processes
+"""
+import os
+import time
+from base64 import b64decode
+from binascii import Error
+import concurrent.futures
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Callable, List, NamedTuple, Optional, Tuple
+
+from pytris.replay import Replay
+
+
+class VerificationResult(NamedTuple):
+    session_id: str
+    valid: bool
+    # reason of the mismatch, empty if valid
+    reason: str
+    frames: int
+    # worker process CPU time spent on the replay, in seconds
+    cpu_time: float
+
+
+def verify_replay(session_id: str, replay_data: bytes, start_state: dict, final_state: dict) -> VerificationResult:
+    """
+    Re-simulate a replay (worker process entry point)
+    :param start_state: session data sent by the server when the game started, seed included
+    :param final_state: last session data sent by the client
+    """
+    start = time.process_time()
+    frames = 0
+    try:
+        replay = Replay(replay_data)
+        if replay.state != start_state:
+            reason = "replay does not start from the session issued by the server"
+        else:
+            frames = sum(1 for _ in replay.frames())
+            simulated = replay.play().get_state()
+            mismatches = [key for key, value in simulated.items() if final_state.get(key) != value]
+            reason = f"simulated {', '.join(mismatches)} do not match" if mismatches else ""
+    except (ValueError, IndexError, KeyError) as e:
+        reason = f"invalid replay: {e}"
+    return VerificationResult(session_id, not reason, reason, frames, time.process_time() - start)
+
+
+class ReplayVerifier:
+    """
+        Process pool verifying replays without blocking the server loop
+    """
+
+    def __init__(self, workers: Optional[int] = None):
+        self.workers = workers or os.cpu_count() or 1
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._pending: List[Future] = []
+        self.verified = 0
+        self.cpu_time = 0.0
+        # called from another thread when a verification finishes, to wake the server loop up
+        self.on_done: Optional[Callable[[], None]] = None
+
+    def submit(self, session_id: str, replay_data: bytes, start_state: dict, final_state: dict):
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        future = self._executor.submit(verify_replay, session_id, replay_data, start_state, final_state)
+        if self.on_done is not None:
+            future.add_done_callback(lambda _: self.on_done())
+        self._pending.append(future)
+
+    def poll(self) -> List[VerificationResult]:
+        """
+        :return: results of the verifications finished since last poll
+        """
+        done = []
+        pending = []
+        for future in self._pending:
+            (done if future.done() else pending).append(future)
+        self._pending = pending
+        results = []
+        for future in done:
+            result = future.result()
+            self.verified += 1
+            self.cpu_time += result.cpu_time
+            results.append(result)
+        return results
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending)
+
+    @property
+    def throughput(self) -> float:
+        """
+        Replays verified per second per core
+        """
+        return self.verified / self.cpu_time if self.cpu_time > 0 else 0.0
+
+    def wait(self, timeout: Optional[float] = None) -> List[VerificationResult]:
+        """
+        Wait for all pending verifications
+        :return: results of the verifications finished since last poll
+        """
+        concurrent.futures.wait(self._pending, timeout)
+        return self.poll()
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+def load_replay_data(encoded: str) -> Tuple[Optional[bytes], Optional[str]]:
+    """
+    :return: replay bytes from a base64 string, or an error message
+    """
+    try:
+        return b64decode(encoded, validate=True), None
+    except (Error, ValueError, TypeError):
+        return None, "Replay is not valid base64"
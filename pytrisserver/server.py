@@ -13,10 +13,10 @@ class MyServer(Server):
     """
     channelClass = ClientChannel
 
-    def __init__(self, *args, **kwargs):
+    def __init__(self, *args, session_manager: SessionManager = None, **kwargs):
         self.id = 0
         Server.__init__(self, *args, **kwargs)
-        self.session_manager = SessionManager()
+        self.session_manager = SessionManager() if session_manager is None else session_manager
         print('Server launched')
 
     def Connected(self, channel, addr):
@@ -1,13 +1,25 @@
 """
     Manage sessions lifecycle
 """
-import json
+import copy
 import os
 import string
 import random
 import time
+import zlib
 from base64 import b64encode
-from typing import Optional
+from typing import Dict, Optional, Tuple
+
+from pytris import randomizer
+from pytrisserver.replayverifier import ReplayVerifier
+from pytrisserver.store import JournalStore, SessionStore
+
+
+def shard_of(session_id: str, shards: int) -> int:
+    """
+        Shard owning a session. The hash must be the same in every process, unlike the salted str hash
+    """
+    return zlib.crc32(str(session_id).encode()) % shards
 
 
 class SessionManager:
@@ -15,28 +27,76 @@ class SessionManager:
         Session manager
     """
 
-    SESSIONS_FILE_PATH = "sessions.json"
+    # ended sessions kept waiting for their replay
+    MAX_ENDED_SESSIONS = 1000
+    # sessions not updated for this time (in seconds) are deleted
+    SESSION_TTL = 30 * 24 * 3600
+    # expired sessions looked at by each sweep call, and time between sweeps of all the sessions, in seconds
+    SWEEP_SLICE = 50
+    SWEEP_INTERVAL = 60.0
 
-    def __init__(self):
-        self.sessions: dict = {}
-        self.session_users = {}
-        if os.path.exists(self.SESSIONS_FILE_PATH):
-            with open(self.SESSIONS_FILE_PATH, 'r') as f:
-                self.sessions: dict = json.load(f)
+    def __init__(self, store: Optional[SessionStore] = None, session_ttl: Optional[float] = None,
+                 shard: int = 0, shards: int = 1, verifier_workers: Optional[int] = None):
+        """
+            shard, shards: the manager only allocates session ids owned by given shard, out of given shard count
+            verifier_workers: replay verification processes, one per core if not given
+        """
+        # session id -> player, for the sessions joined by a player
+        self.session_users: Dict[str, object] = {}
+        # session id -> (player, start state, last data) of topped out sessions
+        self._ended_sessions: Dict[str, tuple] = {}
+        # session id -> reason, for sessions whose replay did not match
+        self.flagged_sessions: Dict[str, str] = {}
+        self.verifier = ReplayVerifier(verifier_workers)
+        self.store = JournalStore() if store is None else store
+        self.session_ttl = self.SESSION_TTL if session_ttl is None else session_ttl
+        # (last update, id) of the last session looked at by the current sweep, None when starting a sweep
+        self._sweep_after: Optional[Tuple[float, str]] = None
+        self._next_sweep = 0.0
+        self.expired = 0
+        self.shard = shard
+        self.shards = shards
 
-    def _save(self):
-        with open(self.SESSIONS_FILE_PATH, 'w') as f:
-            json.dump(self.sessions, f)
+    def flush(self):
+        """
+            Write the session changes waiting for too long, to call regularly
+        """
+        self.store.flush()
+
+    def close(self):
+        self.store.close()
+        self.verifier.shutdown()
+
+    def sweep(self):
+        """
+            Delete a slice of the sessions not updated for longer than the session TTL, to call regularly.
+            Sessions used by a player are kept. Once no expired session is left, the next sweep waits for
+            the sweep interval.
+        """
+        now = time.monotonic()
+        if now < self._next_sweep:
+            return
+        expired = list(self.store.by_last_update(before=time.time() - self.session_ttl, after=self._sweep_after,
+                                                 limit=self.SWEEP_SLICE))
+        for session_id, session in expired:
+            self._sweep_after = (session["metadata"]["last_update"], session_id)
+            if self.session_users.get(session_id) is not None:
+                continue
+            self.store.delete(session_id)
+            self.expired += 1
+        if len(expired) < self.SWEEP_SLICE:
+            self._sweep_after = None
+            self._next_sweep = now + self.SWEEP_INTERVAL
 
     def _generate_session_id(self):
         letters = string.ascii_lowercase
         res = ''.join(random.choice(letters) for _ in range(10))
-        while res in self.sessions:
+        while shard_of(res, self.shards) != self.shard or res in self.store:
             res = ''.join(random.choice(letters) for _ in range(10))
         return res
 
-    def _new_session(self, session_id):
-        self.sessions[session_id] = {
+    def _new_session(self, session_id) -> dict:
+        session = {
             "metadata": {
                 "last_update": time.time()
             },
@@ -46,6 +106,7 @@ class SessionManager:
                 "hold_piece": None,
                 "holt": False,
                 "piece_count": 0,
+                "randomizer": randomizer.VERSION,
                 "timer": 0,
                 "stats": {
                     "Level": 1,
@@ -74,25 +135,39 @@ class SessionManager:
                 "grid": [[0] * 10 for _ in range(22)]
             }
         }
-        self._save()
+        self.store.put(session_id, session)
+        return session
+
+    def _load_session(self, session_id) -> dict:
+        session = self.store.get(session_id)
+        if session is None:
+            session = self._new_session(session_id)
+        return session
 
     def get_session(self, session_id) -> dict:
-        if session_id not in self.sessions:
-            self._new_session(session_id)
-        if session_id not in self.session_users:
-            self.session_users[session_id] = None
-        return self.sessions[session_id]["data"]
+        return self._load_session(session_id)["data"]
+
+    def issue_session(self, session_id) -> dict:
+        """
+            Session data sent to a client starting a game. It is kept in the session metadata as the start state
+            (seed included) the replay of the game is verified from.
+        """
+        session = self._load_session(session_id)
+        metadata = session["metadata"]
+        metadata["start_state"] = copy.deepcopy(session["data"])
+        metadata["last_update"] = time.time()
+        self.store.put(session_id, session)
+        return session["data"]
 
     def join_session(self, session_id, player) -> Optional[str]:
         self.get_session(session_id)
-        if self.session_users[session_id] is not None:
+        if self.session_users.get(session_id) is not None:
             return "Session is already used"
         self.session_users[session_id] = player
 
     def leave_session(self, session_id, player):
-        self.get_session(session_id)
-        if self.session_users[session_id] == player:
-            self.session_users[session_id] = None
+        if self.session_users.get(session_id) == player:
+            del self.session_users[session_id]
 
     def get_new_session_id(self) -> str:
         session_id = self._generate_session_id()
@@ -100,23 +175,73 @@ class SessionManager:
         return session_id
 
     def delete_session(self, session_id, player) -> Optional[str]:
-        if session_id not in self.sessions:
+        session = self.store.get(session_id)
+        if session is None:
             return "Session does not exist"
-        if self.session_users[session_id] != player:
+        if self.session_users.get(session_id) != player:
             return "Player is not in session"
-        self.sessions.pop(session_id)
-        self.session_users.pop(session_id)
-        self._save()
+        data = session["data"]
+        start_state = session["metadata"].get("start_state")
+        self.store.delete(session_id)
+        del self.session_users[session_id]
+        if start_state is not None:
+            self._ended_sessions[session_id] = (player, start_state, data)
+            if len(self._ended_sessions) > self.MAX_ENDED_SESSIONS:
+                self._ended_sessions.pop(next(iter(self._ended_sessions)))
 
     def update_session(self, session_id, player, data) -> Optional[str]:
         """
             return None if everything is OK, an error message if update failed
+            an update holding the same data as the session is not saved again
         """
-        if session_id not in self.sessions:
+        session = self.store.get(session_id)
+        if session is None:
             return "Session does not exist"
-        if self.session_users[session_id] != player:
+        if self.session_users.get(session_id) != player:
             return "Player is not in session"
 
-        self.sessions[session_id]["data"].update(data)
-        self.sessions[session_id]["metadata"]["last_update"] = time.time()
-        self._save()
+        stored = session["data"]
+        if all(key in stored and stored[key] == value for key, value in data.items()):
+            return
+        stored.update(data)
+        session["metadata"]["last_update"] = time.time()
+        self.store.put(session_id, session)
+
+    def submit_replay(self, session_id, player, replay_data: bytes) -> Optional[str]:
+        """
+            Queue the verification of the replay of the game played since the session was issued,
+            against the last session update
+            return None if the replay was queued, an error message otherwise
+        """
+        session = self.store.get(session_id)
+        if session is not None:
+            if self.session_users.get(session_id) != player:
+                return "Player is not in session"
+            start_state = session["metadata"].get("start_state")
+            final_state = copy.deepcopy(session["data"])
+        elif session_id in self._ended_sessions and self._ended_sessions[session_id][0] == player:
+            _, start_state, final_state = self._ended_sessions.pop(session_id)
+        else:
+            return "Session does not exist"
+        if start_state is None:
+            return "Session was not started"
+        self.verifier.submit(session_id, replay_data, start_state, final_state)
+
+    def poll_verifications(self):
+        """
+            Flag the sessions whose replay verification failed since last poll, and report verification throughput
+        """
+        for result in self.verifier.poll():
+            if result.valid:
+                print(f"session {result.session_id}: replay verified ({result.frames} frames)")
+            else:
+                print(f"session {result.session_id}: replay mismatch, {result.reason}")
+                self.flagged_sessions[result.session_id] = result.reason
+                session = self.store.get(result.session_id)
+                if session is not None:
+                    session["metadata"]["flagged"] = result.reason
+                    # saving moves the session to the end of the last update order
+                    session["metadata"]["last_update"] = time.time()
+                    self.store.put(result.session_id, session)
+            print(f"{self.verifier.verified} replays verified, {self.verifier.throughput:.1f} replays/s per core")
+
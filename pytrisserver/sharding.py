@@ -0,0 +1,397 @@
+"""
+    Sharded server: sessions split between worker processes
+
+An acceptor process listens for the clients and reads the first message of each connection. The connection is then
+handed over (its socket is passed through a Unix socket) to the worker owning the session of the message, given by
+shard_of, or to the next worker in turn for a message without session id (get_session_id). The worker talks to the
+client directly from then on. Each worker has its own session manager and store files, and only allocates session ids
+it owns, so the workers never need to agree on anything.
+
+A connection sending a message for a session owned by another worker is handed back to the acceptor with the
+message, and goes to the owning worker.
+
+Passing sockets between processes needs a Unix platform. The processes wait for their sockets with poll: an epoll
+registration outlives the closing of a socket while another process still has it, and would be reported for a new
+socket given the same file descriptor.
+"""
+import multiprocessing
+import os
+import selectors
+import socket
+import struct
+from collections import deque
+from typing import Deque, List, Optional, Tuple
+
+from PodSixNet.asyncwrapper import asyncore
+from PodSixNet.Channel import Channel
+from PodSixNet.rencode import loads
+
+from pytrisserver.channel import ClientChannel
+from pytrisserver.eventloop import EventLoop, serve
+from pytrisserver.journal import JOURNAL_PATH, SNAPSHOT_PATH
+from pytrisserver.server import MyServer
+from pytrisserver.sessionmanager import SessionManager, shard_of
+from pytrisserver.store import JSON_PATH, SQLITE_PATH, new_store
+
+TERMINATOR = Channel.endchars.encode()
+# (client was sent the connected message, length of the data received from the client and not handled yet),
+# followed by the data. The connection socket is sent with the header.
+HANDOFF_HEADER = struct.Struct("!?I")
+# connections received by a single read of a Unix socket
+MAX_HANDOFFS = 16
+# pending connections of the acceptor socket
+LISTEN_BACKLOG = 128
+# store files of each store type, a shard index is added to their names
+STORE_PATHS = {
+    "json": {"path": JSON_PATH},
+    "journal": {"snapshot_path": SNAPSHOT_PATH, "journal_path": JOURNAL_PATH},
+    "sqlite": {"path": SQLITE_PATH}
+}
+
+
+def shard_store_params(store_params: dict, shard: int) -> dict:
+    """
+    :return: store parameters of a shard, its store files are the configured ones with the shard index in their name
+    """
+    params = dict(store_params)
+    for key, default in STORE_PATHS.get(params.get("type", "journal"), {}).items():
+        root, extension = os.path.splitext(params.get(key, default))
+        params[key] = f"{root}.{shard}{extension}"
+    return params
+
+
+class HandoffDispatcher(asyncore.dispatcher):
+    """
+        Client connections handed over a Unix socket, in both directions. The socket does not block: the
+        connections to send are queued, and sent when the other process reads them.
+    """
+
+    def __init__(self, link: socket.socket, socket_map: dict):
+        asyncore.dispatcher.__init__(self, link, socket_map)
+        self._buffer = b""
+        # sockets received, in the order of their headers
+        self._fds: Deque[int] = deque()
+        # frames to send, with the connection socket to send with the first byte (None once sent)
+        self._outgoing: Deque[Tuple[bytes, Optional[socket.socket]]] = deque()
+
+    def writable(self) -> bool:
+        return bool(self._outgoing)
+
+    def send_connection(self, connection: socket.socket, data: bytes, connected: bool):
+        """
+        Hand a client connection over to the process at the other end.
+        The connection socket can be closed afterwards, a duplicate is kept until it is sent.
+        :param data: data received from the client and not handled yet
+        :param connected: whether the client was sent the connected message
+        """
+        self._outgoing.append((HANDOFF_HEADER.pack(connected, len(data)) + data, connection.dup()))
+        self.handle_write()
+
+    def handle_write(self):
+        while self._outgoing:
+            frame, connection = self._outgoing[0]
+            try:
+                if connection is None:
+                    sent = self.socket.send(frame)
+                else:
+                    sent = socket.send_fds(self.socket, [frame], [connection.fileno()])
+            except BlockingIOError:
+                return
+            if connection is not None:
+                connection.close()
+            if sent < len(frame):
+                self._outgoing[0] = (frame[sent:], None)
+                return
+            self._outgoing.popleft()
+
+    def close(self):
+        for _, connection in self._outgoing:
+            if connection is not None:
+                connection.close()
+        self._outgoing.clear()
+        asyncore.dispatcher.close(self)
+
+    def handle_read(self):
+        try:
+            data, fds, _, _ = socket.recv_fds(self.socket, 65536, MAX_HANDOFFS)
+        except BlockingIOError:
+            return
+        if not data:
+            self.handle_close()
+            return
+        self._buffer += data
+        self._fds.extend(fds)
+        while len(self._buffer) >= HANDOFF_HEADER.size:
+            connected, length = HANDOFF_HEADER.unpack_from(self._buffer)
+            end = HANDOFF_HEADER.size + length
+            if len(self._buffer) < end:
+                break
+            client_data = self._buffer[HANDOFF_HEADER.size:end]
+            self._buffer = self._buffer[end:]
+            self.handle_connection(socket.socket(fileno=self._fds.popleft()), client_data, connected)
+
+    def handle_connection(self, connection: socket.socket, data: bytes, connected: bool):
+        raise NotImplementedError
+
+
+class ShardChannel(ClientChannel):
+    """
+        Client channel of a worker, handed back to the acceptor on a message for a session of another shard.
+        The replies to the previous messages are sent first: the channel stops reading, and is handed back once
+        its output buffer is written.
+    """
+
+    def __init__(self, *args, **kwargs):
+        ClientChannel.__init__(self, *args, **kwargs)
+        # data received from the client and not handled, to hand back with the connection
+        self._handoff: Optional[bytes] = None
+
+    def readable(self) -> bool:
+        # once handed back, the next messages are read by the next owner
+        return self._handoff is None and ClientChannel.readable(self)
+
+    def feed(self, data: bytes):
+        """
+        Handle data received from the client by another process
+        """
+        self.ac_in_buffer = data
+        while self.connected and TERMINATOR in self.ac_in_buffer:
+            self._ibuffer, self.ac_in_buffer = self.ac_in_buffer.split(TERMINATOR, 1)
+            self.found_terminator()
+
+    def found_terminator(self):
+        data = loads(self._ibuffer)
+        session_id = data.get("session_id") if isinstance(data, dict) else None
+        if session_id is not None and not self._server.owns(session_id):
+            self.hand_back(self._ibuffer + TERMINATOR + self.ac_in_buffer)
+            return
+        # as Channel.found_terminator, without decoding the message again
+        self._ibuffer = b""
+        if isinstance(data, dict) and "action" in data:
+            for name in ("Network_" + data["action"], "Network"):
+                if hasattr(self, name):
+                    getattr(self, name)(data)
+        else:
+            print("OOB data:", data)
+
+    def hand_back(self, data: bytes):
+        """
+        Hand the connection back to the acceptor once the replies to the previous messages are sent
+        :param data: data received from the client and not handled yet
+        """
+        self._handoff = data
+        self._ibuffer = b""
+        self.ac_in_buffer = b""
+        self.Pump()
+        self._hand_back_if_sent()
+
+    def handle_write(self):
+        ClientChannel.handle_write(self)
+        self._hand_back_if_sent()
+
+    def _hand_back_if_sent(self):
+        if self._handoff is not None and not self.producer_fifo and self.connected:
+            self._server.send_back(self, self._handoff)
+
+
+class ShardServer(HandoffDispatcher, MyServer):
+    """
+        Worker server: serves the connections handed over by the acceptor, for the sessions of its shard
+    """
+    channelClass = ShardChannel
+
+    def __init__(self, link: socket.socket, session_manager: SessionManager):
+        """
+        :param link: Unix socket to the acceptor
+        """
+        self.id = 0
+        self._map = {}
+        self.channels = []
+        self.session_manager = session_manager
+        HandoffDispatcher.__init__(self, link, self._map)
+        print(f"Shard {session_manager.shard} launched")
+
+    def owns(self, session_id: str) -> bool:
+        return shard_of(session_id, self.session_manager.shards) == self.session_manager.shard
+
+    def handle_connection(self, connection: socket.socket, data: bytes, connected: bool):
+        try:
+            addr = connection.getpeername()
+        except OSError:
+            # client already gone
+            connection.close()
+            return
+        channel = self.channelClass(connection, addr, self, self._map)
+        self.channels.append(channel)
+        if not connected:
+            channel.Send({"action": "connected"})
+            self.Connected(channel, addr)
+        channel.feed(data)
+
+    def send_back(self, channel: ShardChannel, data: bytes):
+        """
+        Hand a connection back to the acceptor, its session is left
+        :param data: data received from the client and not handled yet
+        """
+        if channel.session_id:
+            self.session_manager.leave_session(channel.session_id, channel.addr)
+        self.send_connection(channel.socket, data, True)
+        channel.close()
+
+    def handle_close(self):
+        # the acceptor is gone
+        self.close()
+        raise asyncore.ExitNow("acceptor closed")
+
+
+def run_worker(shard: int, shards: int, link: socket.socket, store_params: dict, session_ttl: Optional[float]):
+    """
+    Worker process entry point
+    """
+    params = shard_store_params(store_params, shard)
+    store = new_store(params.pop("type", "journal"), **params)
+    # the cores are shared between the replay verifications of all the shards
+    verifier_workers = max(1, (os.cpu_count() or 1) // shards)
+    session_manager = SessionManager(store, session_ttl, shard, shards, verifier_workers)
+    server = ShardServer(link, session_manager)
+    try:
+        serve(server, selectors.PollSelector())
+    except (asyncore.ExitNow, KeyboardInterrupt):
+        pass
+
+
+class PendingConnection(asyncore.dispatcher):
+    """
+        Client connection waiting for its first message in the acceptor
+    """
+
+    def __init__(self, acceptor: "Acceptor", connection: socket.socket, data: bytes = b"", connected: bool = False):
+        asyncore.dispatcher.__init__(self, connection, acceptor._map)
+        self.acceptor = acceptor
+        self.data = data
+        self.client_connected = connected
+
+    def writable(self) -> bool:
+        return False
+
+    def handle_read(self):
+        self.data += self.recv(65536)
+        if self.connected:
+            self.acceptor.route(self)
+
+    def handle_close(self):
+        self.close()
+
+
+class WorkerLink(HandoffDispatcher):
+    """
+        Connections handed over to a worker, and handed back by it to the acceptor
+    """
+
+    def __init__(self, acceptor: "Acceptor", link: socket.socket):
+        HandoffDispatcher.__init__(self, link, acceptor._map)
+        self.acceptor = acceptor
+
+    def handle_connection(self, connection: socket.socket, data: bytes, connected: bool):
+        self.acceptor.route(PendingConnection(self.acceptor, connection, data, connected))
+
+    def handle_close(self):
+        print("worker link closed")
+        self.close()
+
+
+class Acceptor(asyncore.dispatcher):
+    """
+        Accept the client connections and route them to the workers
+    """
+
+    def __init__(self, localaddr: Tuple[str, int]):
+        self._map = {}
+        # only needed by the event loop, the acceptor does not send any message
+        self.channels = []
+        asyncore.dispatcher.__init__(self, map=self._map)
+        self.create_socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.set_reuse_addr()
+        self.bind(localaddr)
+        self.listen(LISTEN_BACKLOG)
+        self.workers: List[WorkerLink] = []
+        self._next_worker = 0
+
+    def add_worker(self, link: socket.socket):
+        self.workers.append(WorkerLink(self, link))
+
+    def handle_accept(self):
+        try:
+            accepted = self.accept()
+        except OSError:
+            print('warning: acceptor accept() threw an exception')
+            return
+        if accepted is None:
+            return
+        connection, _ = accepted
+        connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        PendingConnection(self, connection)
+
+    def _worker_of(self, message: bytes) -> int:
+        try:
+            data = loads(message)
+        except (ValueError, IndexError, KeyError):
+            data = None
+        if isinstance(data, dict) and data.get("session_id") is not None:
+            return shard_of(data["session_id"], len(self.workers))
+        # any worker can allocate a new session id
+        self._next_worker = (self._next_worker + 1) % len(self.workers)
+        return self._next_worker
+
+    def route(self, pending: PendingConnection):
+        """
+        Hand a connection over to a worker once its first message is received
+        """
+        if TERMINATOR not in pending.data:
+            return
+        worker = self._worker_of(pending.data.split(TERMINATOR, 1)[0])
+        self.workers[worker].send_connection(pending.socket, pending.data, pending.client_connected)
+        pending.close()
+
+
+class ShardedServer:
+    """
+        Acceptor and worker processes
+    """
+
+    def __init__(self, localaddr: Tuple[str, int], workers: int, store_params: dict,
+                 session_ttl: Optional[float] = None):
+        # workers are spawned: they only get their own links, so they see the acceptor closing them
+        context = multiprocessing.get_context("spawn")
+        self.processes = []
+        links = []
+        for shard in range(workers):
+            link, worker_link = socket.socketpair()
+            process = context.Process(target=run_worker, name=f"shard {shard}",
+                                      args=(shard, workers, worker_link, store_params, session_ttl))
+            process.start()
+            worker_link.close()
+            self.processes.append(process)
+            links.append(link)
+        self.acceptor = Acceptor(localaddr)
+        for link in links:
+            self.acceptor.add_worker(link)
+        print(f"Server launched with {workers} shards")
+
+    def run(self):
+        loop = EventLoop(self.acceptor, selectors.PollSelector())
+        try:
+            loop.run()
+        finally:
+            loop.close()
+            self.close()
+
+    def close(self):
+        """
+        Close the links to the workers, and wait for them to write their sessions
+        """
+        for worker in self.acceptor.workers:
+            worker.close()
+        self.acceptor.close()
+        for process in self.processes:
+            process.join()
@@ -0,0 +1,369 @@
+"""
+    Session stores: where the server keeps its sessions
+
+A session is a dict {"metadata": {"last_update": time, ...}, "data": session data in the JSON session format}.
+Sessions read from a store are saved again with put after being modified.
+"""
+import json
+import os
+import sqlite3
+import time
+from collections import OrderedDict
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from pytrisserver.journal import SYNC_BATCH, SYNC_INTERVAL, SessionJournal
+
+SQLITE_PATH = "sessions.db"
+JSON_PATH = "sessions.json"
+# sessions kept in memory by a cached store
+MAX_SESSIONS = 10000
+
+
+class SessionStore:
+    """
+        Store interface
+    """
+
+    def get(self, session_id: str) -> Optional[dict]:
+        """
+        :return: session, None if it does not exist
+        """
+        raise NotImplementedError
+
+    def put(self, session_id: str, session: dict):
+        raise NotImplementedError
+
+    def delete(self, session_id: str):
+        raise NotImplementedError
+
+    def __contains__(self, session_id: str) -> bool:
+        return self.get(session_id) is not None
+
+    def __len__(self) -> int:
+        raise NotImplementedError
+
+    def by_last_update(self, before: Optional[float] = None, after: Optional[Tuple[float, str]] = None,
+                       limit: Optional[int] = None) -> Iterator[Tuple[str, dict]]:
+        """
+        :param before: only sessions last updated before this time if given
+        :param after: (last update, session id) cursor: only sessions after it in the iteration order if given
+        :param limit: maximum number of sessions if given
+        :return: (session id, session) iterator, by last update then session id
+        """
+        raise NotImplementedError
+
+    def flush(self):
+        """
+        Write the changes waiting for too long, to call regularly
+        """
+
+    def close(self):
+        """
+        Write all the changes
+        """
+
+
+class MemoryStore(SessionStore):
+    """
+        Sessions kept in a dict, lost on exit.
+        The dict is kept in put order, which is the last update order as sessions are put when updated.
+    """
+
+    def __init__(self, sessions: Optional[Dict[str, dict]] = None):
+        sessions = {} if sessions is None else sessions
+        self.sessions: Dict[str, dict] = dict(sorted(sessions.items(),
+                                                     key=lambda item: item[1]["metadata"]["last_update"]))
+
+    def get(self, session_id: str) -> Optional[dict]:
+        return self.sessions.get(session_id)
+
+    def put(self, session_id: str, session: dict):
+        # moved to the end
+        self.sessions.pop(session_id, None)
+        self.sessions[session_id] = session
+
+    def delete(self, session_id: str):
+        self.sessions.pop(session_id, None)
+
+    def __contains__(self, session_id: str) -> bool:
+        return session_id in self.sessions
+
+    def __len__(self) -> int:
+        return len(self.sessions)
+
+    def by_last_update(self, before: Optional[float] = None, after: Optional[Tuple[float, str]] = None,
+                       limit: Optional[int] = None) -> Iterator[Tuple[str, dict]]:
+        # collected first, so the sessions can be deleted while iterating. Sessions updated at the same time are
+        # in put order: once the limit is reached, the ones updated at the time of the last session are collected
+        # too, before sorting them by id.
+        items: List[Tuple[float, str, dict]] = []
+        for session_id, session in self.sessions.items():
+            last_update = session["metadata"]["last_update"]
+            if before is not None and last_update >= before:
+                break
+            if limit is not None and len(items) >= limit and last_update > items[-1][0]:
+                break
+            if after is None or (last_update, session_id) > after:
+                items.append((last_update, session_id, session))
+        items.sort(key=lambda item: item[:2])
+        return ((session_id, session) for _, session_id, session in items[:limit])
+
+
+class JsonFileStore(MemoryStore):
+    """
+        Sessions kept in a dict, the whole dict is written to a JSON file on each change
+    """
+
+    def __init__(self, path: str = JSON_PATH):
+        sessions = {}
+        if os.path.exists(path):
+            with open(path, "r") as f:
+                sessions = json.load(f)
+        super().__init__(sessions)
+        self.path = path
+
+    def _save(self):
+        with open(self.path, "w") as f:
+            json.dump(self.sessions, f)
+
+    def put(self, session_id: str, session: dict):
+        super().put(session_id, session)
+        self._save()
+
+    def delete(self, session_id: str):
+        super().delete(session_id)
+        self._save()
+
+
+class JournalStore(MemoryStore):
+    """
+        Sessions kept in a dict, changes appended to a session journal
+    """
+
+    def __init__(self, journal: Optional[SessionJournal] = None):
+        self.journal = SessionJournal() if journal is None else journal
+        super().__init__(self.journal.load())
+
+    def put(self, session_id: str, session: dict):
+        super().put(session_id, session)
+        self.journal.put(session_id, session)
+        self._compact_if_due()
+
+    def delete(self, session_id: str):
+        super().delete(session_id)
+        self.journal.delete(session_id)
+        self._compact_if_due()
+
+    def _compact_if_due(self):
+        if self.journal.compaction_due:
+            self.journal.compact(self.sessions)
+
+    def flush(self):
+        self.journal.flush()
+
+    def close(self):
+        self.journal.close()
+
+
+class SqliteStore(SessionStore):
+    """
+        Sessions kept in a SQLite database (WAL mode), one column per session data field, indexed by last update.
+        Changes are committed by batches, like the journal records.
+    """
+    # data fields stored in their own column, other fields are kept in the extra column
+    INT_FIELDS = ("current_piece", "hold_piece", "holt", "piece_count", "timer")
+    JSON_FIELDS = ("stats", "grid")
+    COLUMNS = ("id", "last_update", "metadata", "seed") + INT_FIELDS + JSON_FIELDS + ("extra",)
+
+    # statements are prepared once and kept in the connection statement cache
+    SELECT_COLUMNS = ", ".join(COLUMNS)
+    GET_SQL = f"SELECT {SELECT_COLUMNS} FROM sessions WHERE id = ?"
+    PUT_SQL = f"INSERT OR REPLACE INTO sessions ({SELECT_COLUMNS}) VALUES ({', '.join('?' * len(COLUMNS))})"
+    DELETE_SQL = "DELETE FROM sessions WHERE id = ?"
+    CONTAINS_SQL = "SELECT 1 FROM sessions WHERE id = ?"
+    COUNT_SQL = "SELECT COUNT(*) FROM sessions"
+    BY_LAST_UPDATE_SQL = (f"SELECT {SELECT_COLUMNS} FROM sessions WHERE (last_update, id) > (?, ?) "
+                          f"AND last_update < ? ORDER BY last_update, id LIMIT ?")
+
+    def __init__(self, path: str = SQLITE_PATH, sync_batch: int = SYNC_BATCH, sync_interval: float = SYNC_INTERVAL):
+        self.path = path
+        self.sync_batch = sync_batch
+        self.sync_interval = sync_interval
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        # WAL commits survive an application crash, fsyncs happen at checkpoints
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            "id TEXT PRIMARY KEY, last_update REAL NOT NULL, metadata TEXT NOT NULL, seed TEXT NOT NULL, "
+            "current_piece INTEGER, hold_piece INTEGER, holt INTEGER, piece_count INTEGER, timer INTEGER, "
+            "stats TEXT, grid TEXT, extra TEXT)")
+        self._db.execute("DROP INDEX IF EXISTS sessions_last_update")
+        self._db.execute("CREATE INDEX IF NOT EXISTS sessions_last_update_id ON sessions (last_update, id)")
+        self._db.commit()
+        # changes not committed yet, and time of the oldest one
+        self._uncommitted = 0
+        self._uncommitted_since = 0.0
+
+    def _to_row(self, session_id: str, session: dict) -> tuple:
+        metadata = dict(session["metadata"])
+        last_update = metadata.pop("last_update")
+        data = dict(session["data"])
+        row = [session_id, last_update, json.dumps(metadata), data.pop("seed")]
+        row += [data.pop(field, None) for field in self.INT_FIELDS]
+        row += [json.dumps(data.pop(field, None)) for field in self.JSON_FIELDS]
+        row.append(json.dumps(data) if data else None)
+        return tuple(row)
+
+    def _from_row(self, row: tuple) -> Tuple[str, dict]:
+        session_id, last_update, metadata, seed = row[:4]
+        metadata = json.loads(metadata)
+        metadata["last_update"] = last_update
+        data = {"seed": seed}
+        offset = 4
+        for field in self.INT_FIELDS:
+            data[field] = row[offset]
+            offset += 1
+        # holt is stored as an integer
+        data["holt"] = bool(data["holt"])
+        for field in self.JSON_FIELDS:
+            data[field] = json.loads(row[offset])
+            offset += 1
+        if row[offset] is not None:
+            data.update(json.loads(row[offset]))
+        return session_id, {"metadata": metadata, "data": data}
+
+    def get(self, session_id: str) -> Optional[dict]:
+        row = self._db.execute(self.GET_SQL, (session_id,)).fetchone()
+        return None if row is None else self._from_row(row)[1]
+
+    def put(self, session_id: str, session: dict):
+        self._db.execute(self.PUT_SQL, self._to_row(session_id, session))
+        self._changed()
+
+    def delete(self, session_id: str):
+        self._db.execute(self.DELETE_SQL, (session_id,))
+        self._changed()
+
+    def _changed(self):
+        if self._uncommitted == 0:
+            self._uncommitted_since = time.monotonic()
+        self._uncommitted += 1
+        if self._uncommitted >= self.sync_batch:
+            self.commit()
+
+    def commit(self):
+        if self._uncommitted:
+            self._db.commit()
+            self._uncommitted = 0
+
+    def __contains__(self, session_id: str) -> bool:
+        return self._db.execute(self.CONTAINS_SQL, (session_id,)).fetchone() is not None
+
+    def __len__(self) -> int:
+        return self._db.execute(self.COUNT_SQL).fetchone()[0]
+
+    def by_last_update(self, before: Optional[float] = None, after: Optional[Tuple[float, str]] = None,
+                       limit: Optional[int] = None) -> Iterator[Tuple[str, dict]]:
+        cursor = (float("-inf"), "") if after is None else after
+        bounds = cursor + (float("inf") if before is None else before, -1 if limit is None else limit)
+        # fetched first, so the sessions can be deleted while iterating
+        rows = self._db.execute(self.BY_LAST_UPDATE_SQL, bounds).fetchall()
+        return (self._from_row(row) for row in rows)
+
+    def flush(self):
+        if self._uncommitted and time.monotonic() - self._uncommitted_since >= self.sync_interval:
+            self.commit()
+
+    def close(self):
+        self.commit()
+        self._db.close()
+
+
+class CachedStore(SessionStore):
+    """
+        Sessions of a disk store, with the most recently used ones kept in memory.
+        Changes are written through to the disk store, so sessions over the memory cap are spilled in least recently
+        used order by dropping them from memory. They are read back from disk when used again.
+    """
+
+    def __init__(self, backing: SessionStore, max_sessions: int = MAX_SESSIONS):
+        self.backing = backing
+        self.max_sessions = max_sessions
+        self._hot: "OrderedDict[str, dict]" = OrderedDict()
+        # sessions read back from disk, and dropped from memory
+        self.faults = 0
+        self.spills = 0
+
+    def _cache(self, session_id: str, session: dict):
+        self._hot[session_id] = session
+        self._hot.move_to_end(session_id)
+        while len(self._hot) > self.max_sessions:
+            self._hot.popitem(last=False)
+            self.spills += 1
+
+    def get(self, session_id: str) -> Optional[dict]:
+        session = self._hot.get(session_id)
+        if session is not None:
+            self._hot.move_to_end(session_id)
+            return session
+        session = self.backing.get(session_id)
+        if session is not None:
+            self.faults += 1
+            self._cache(session_id, session)
+        return session
+
+    def put(self, session_id: str, session: dict):
+        self.backing.put(session_id, session)
+        self._cache(session_id, session)
+
+    def delete(self, session_id: str):
+        self._hot.pop(session_id, None)
+        self.backing.delete(session_id)
+
+    def __contains__(self, session_id: str) -> bool:
+        return session_id in self._hot or session_id in self.backing
+
+    def __len__(self) -> int:
+        return len(self.backing)
+
+    @property
+    def in_memory(self) -> int:
+        return len(self._hot)
+
+    def by_last_update(self, before: Optional[float] = None, after: Optional[Tuple[float, str]] = None,
+                       limit: Optional[int] = None) -> Iterator[Tuple[str, dict]]:
+        return self.backing.by_last_update(before, after, limit)
+
+    def flush(self):
+        self.backing.flush()
+
+    def close(self):
+        self.backing.close()
+
+
+# store names, as set in the server parameters
+STORES = {
+    "memory": MemoryStore,
+    "json": JsonFileStore,
+    "journal": JournalStore,
+    "sqlite": SqliteStore
+}
+
+
+def new_store(name: str = "journal", max_sessions: Optional[int] = None, **params) -> SessionStore:
+    """
+    :param max_sessions: sessions kept in memory, over it the least recently used ones are only on disk.
+    All sessions are kept in memory if not given (always for the memory and journal stores)
+    :param params: settings of the store: path for json and sqlite, sync_batch and sync_interval for sqlite,
+    journal settings for journal
+    """
+    if name == "journal":
+        store = JournalStore(SessionJournal(**params))
+    else:
+        store = STORES[name](**params)
+    if max_sessions is None:
+        return store
+    if isinstance(store, MemoryStore):
+        raise ValueError(f"The {name} store keeps all sessions in memory, max_sessions needs the sqlite store")
+    return CachedStore(store, max_sessions)
@@ -12,15 +12,14 @@ from pytris.screen.mainmenu import MainMenuScreen
 from pytris.screen.onlinemenu import OnlineMenuScreen
 from pytris.screen.spmenu import SPMenuScreen
 from pytris.soundmanager import SoundManager
+from pytris.viewport import Viewport
 
 if __name__ == "__main__":
     pygame.init()
 
     begin_size = (500, 720)
-    win = pygame.display.set_mode(begin_size)
-    display_surface = pygame.Surface(begin_size)
+    viewport = Viewport(begin_size)
     clock = pygame.time.Clock()
-    display_surface.fill((0, 0, 0))
     pygame.display.set_caption("Pytris - by Anthonys01")
 
     gui_manager = pygame_gui.UIManager(begin_size, "data/ui_theme.json")
@@ -31,9 +30,9 @@ if __name__ == "__main__":
     settings = PlayerSettings()
     sound = SoundManager(settings)
 
-    main_menu = MainMenuScreen(begin_size, win, display_surface, clock, gui_manager, km, settings, sound)
-    sp_menu = SPMenuScreen(begin_size, win, display_surface, clock, gui_manager, km, settings, sound)
-    online_menu = OnlineMenuScreen(begin_size, win, display_surface, clock, gui_manager, km, settings, sound)
+    main_menu = MainMenuScreen(begin_size, viewport, clock, gui_manager, km, settings, sound)
+    sp_menu = SPMenuScreen(begin_size, viewport, clock, gui_manager, km, settings, sound)
+    online_menu = OnlineMenuScreen(begin_size, viewport, clock, gui_manager, km, settings, sound)
 
     while True:
         main_menu.init_ui()
@@ -44,7 +43,7 @@ if __name__ == "__main__":
             sp_menu.run()
 
             if sp_menu.game_mode >= 0:
-                game = SinglePlayerGameScreen(begin_size, win, display_surface, clock,
+                game = SinglePlayerGameScreen(begin_size, viewport, clock,
                                               gui_manager, km, settings, sound, sp_menu.game_mode)
                 game.init_ui()
                 game.run()
@@ -53,7 +52,7 @@ if __name__ == "__main__":
             online_menu.run()
 
             if online_menu.game_mode >= 0:
-                game = SinglePlayerGameScreen(begin_size, win, display_surface, clock,
+                game = SinglePlayerGameScreen(begin_size, viewport, clock,
                                               gui_manager, km, settings, sound,
                                               online_menu.game_mode, online_menu.session)
                 game.init_ui()
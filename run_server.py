@@ -3,13 +3,23 @@
 """
 import json
 import os.path
-from time import sleep
 
+from pytrisserver.eventloop import serve
 from pytrisserver.server import MyServer
+from pytrisserver.sessionmanager import SessionManager
+from pytrisserver.sharding import ShardedServer
+from pytrisserver.store import new_store
 
 if __name__ == "__main__":
     server_param_path = "server_param.json"
     addr = ("localhost", 4242)
+    # session store: {"type": "memory", "json", "journal" (default) or "sqlite", "max_sessions": memory cap,
+    # store settings}
+    store_params = {}
+    # idle session time to live, in seconds
+    session_ttl = None
+    # worker processes sharing the sessions, each with its own store files
+    workers = 1
     if os.path.exists(server_param_path):
         address = "localhost"
         port = 4242
@@ -19,9 +29,18 @@ if __name__ == "__main__":
                 address = data["address"]
             if "port" in data:
                 port = data["port"]
+            if "store" in data:
+                store_params = dict(data["store"])
+            if "session_ttl" in data:
+                session_ttl = data["session_ttl"]
+            if "workers" in data:
+                workers = data["workers"]
         addr = (address, port)
 
-    myserver = MyServer(localaddr=addr)
-    while True:
-        myserver.Pump()
-        sleep(0.0001)
+    if workers > 1:
+        ShardedServer(addr, workers, store_params, session_ttl).run()
+    else:
+        store = new_store(store_params.pop("type", "journal"), **store_params)
+        session_manager = SessionManager(store, session_ttl)
+        myserver = MyServer(localaddr=addr, session_manager=session_manager)
+        serve(myserver)